@@ -0,0 +1,181 @@
+"""Calculator
+
+A desktop calculator with the four basic operations, parentheses, powers,
+percentages and a memory of the last result. Click the buttons or type on
+the keyboard; Enter evaluates and Escape clears.
+
+Runs in a Tkinter window. Without a display (or with --demo) it works
+through a few sample calculations in the terminal instead.
+
+Expressions are evaluated by walking their syntax tree, never with eval(),
+so only arithmetic can run.
+"""
+import ast
+import math
+import operator
+import sys
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+MAX_EXPONENT = 1000
+
+BUTTONS = [
+    ["C", "(", ")", "/"],
+    ["7", "8", "9", "*"],
+    ["4", "5", "6", "-"],
+    ["1", "2", "3", "+"],
+    ["0", ".", "%", "="],
+    ["Ans", "^", "DEL", ""],
+]
+
+
+class CalculatorError(ValueError):
+    """An expression that can't be calculated, with a message fit for the display"""
+
+
+def _evaluate(node):
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        left, right = _evaluate(node.left), _evaluate(node.right)
+        if isinstance(node.op, ast.Pow) and abs(right) > MAX_EXPONENT:
+            raise CalculatorError("Number too large")
+        return BINARY_OPERATORS[type(node.op)](left, right)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return UNARY_OPERATORS[type(node.op)](_evaluate(node.operand))
+    raise CalculatorError("Invalid expression")
+
+
+def calculate(expression, previous=0):
+    """Evaluate an arithmetic expression; "^" is a power, "%" after a number divides it by 100"""
+    text = expression.replace("^", "**").replace("Ans", f"({previous})").replace("×", "*").replace("÷", "/")
+    # "50%" means 0.5, while "7 % 3" stays a remainder
+    text = "".join(
+        "/100" if char == "%" and text[index + 1:].lstrip()[:1] in ("", ")", "+", "-", "*", "/") else char
+        for index, char in enumerate(text)
+    )
+    if not text.strip():
+        raise CalculatorError("Nothing to calculate")
+    try:
+        tree = ast.parse(text, mode="eval")
+    except SyntaxError:
+        raise CalculatorError("Invalid expression") from None
+    try:
+        result = _evaluate(tree)
+    except ZeroDivisionError:
+        raise CalculatorError("Cannot divide by zero") from None
+    except OverflowError:
+        raise CalculatorError("Number too large") from None
+    if isinstance(result, float) and not math.isfinite(result):
+        raise CalculatorError("Number too large")
+    if isinstance(result, float) and result.is_integer() and abs(result) < 1e15:
+        result = int(result)
+    return result
+
+
+def format_result(value):
+    if isinstance(value, float):
+        return f"{value:.10g}"
+    return str(value)
+
+
+def run_gui(tk):
+    root = tk.Tk()
+    root.title("Calculator")
+    root.resizable(False, False)
+    display = tk.StringVar()
+    history = tk.StringVar()
+    state = {"answer": 0, "just_calculated": False}
+
+    tk.Label(root, textvariable=history, anchor="e", font=("Helvetica", 11), fg="gray").grid(
+        row=0, column=0, columnspan=4, sticky="ew", padx=8)
+    entry = tk.Entry(root, textvariable=display, justify="right", font=("Helvetica", 22), bd=6, relief="flat")
+    entry.grid(row=1, column=0, columnspan=4, sticky="ew", padx=8, pady=(0, 8))
+
+    def press(label):
+        if label == "C":
+            display.set("")
+            history.set("")
+        elif label == "DEL":
+            display.set(display.get()[:-1])
+        elif label == "=":
+            expression = display.get()
+            try:
+                state["answer"] = calculate(expression, state["answer"])
+                history.set(expression + " =")
+                display.set(format_result(state["answer"]))
+                state["just_calculated"] = True
+                return
+            except CalculatorError as e:
+                history.set(str(e))
+        else:
+            # Typing a digit right after a result starts a new calculation
+            if state["just_calculated"] and (label.isdigit() or label == "."):
+                display.set("")
+            display.set(display.get() + label)
+        state["just_calculated"] = False
+
+    for row_index, row in enumerate(BUTTONS, start=2):
+        for column, label in enumerate(row):
+            if not label:
+                continue
+            color = "#f5923e" if label == "=" else "#e0e0e0" if label[0].isdigit() or label == "." else "#c8c8c8"
+            tk.Button(root, text=label, width=5, height=2, font=("Helvetica", 14), bg=color,
+                      command=lambda label=label: press(label)).grid(row=row_index, column=column, padx=2, pady=2)
+
+    def on_key(event):
+        if event.keysym in ("Return", "KP_Enter"):
+            press("=")
+        elif event.keysym == "Escape":
+            press("C")
+        elif event.keysym == "BackSpace":
+            press("DEL")
+        elif event.char and event.char in "0123456789.+-*/()%^":
+            press(event.char)
+        return "break"
+
+    entry.bind("<Key>", on_key)
+    entry.focus_set()
+    root.mainloop()
+
+
+def run_demo():
+    """Work through sample calculations, showing how each one comes out"""
+    samples = ["2 + 3 * 4", "(2 + 3) * 4", "10 / 4", "2 ^ 10", "200 * 15%", "Ans + 1", "7 % 3", "1 / 0", "3 +"]
+    answer = 0
+    print("Sample calculations:")
+    for expression in samples:
+        try:
+            answer = calculate(expression, answer)
+            print(f"  {expression:<12} = {format_result(answer)}")
+        except CalculatorError as e:
+            print(f"  {expression:<12} -> {e}")
+
+
+def main():
+    if "--demo" in sys.argv[1:]:
+        run_demo()
+        return
+    try:
+        import tkinter as tk
+        run_gui(tk)
+    except ImportError:
+        print("Tkinter is not installed (on Linux, install the python3-tk package).")
+        run_demo()
+    except tk.TclError:
+        print("No display available, so here is a demo instead.")
+        run_demo()
+
+
+if __name__ == "__main__":
+    main()
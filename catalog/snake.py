@@ -0,0 +1,187 @@
+"""Snake game
+
+Steer the snake with the arrow keys (or WASD), eat the red food to grow,
+and avoid the walls and your own tail. Press Space to pause and R to
+restart after a game over.
+
+Runs in a Tkinter window. Without a display (or with --demo) it plays a
+short game by itself in the terminal instead.
+"""
+import random
+import sys
+
+GRID_WIDTH = 20
+GRID_HEIGHT = 15
+CELL_SIZE = 24
+TICK_MS = 120
+
+DIRECTIONS = {"Up": (0, -1), "Down": (0, 1), "Left": (-1, 0), "Right": (1, 0)}
+KEY_ALIASES = {"w": "Up", "s": "Down", "a": "Left", "d": "Right"}
+
+
+class SnakeGame:
+    """Game state and rules, independent of how the game is drawn"""
+
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT, seed=None):
+        self.width = width
+        self.height = height
+        self.random = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        middle = (self.width // 2, self.height // 2)
+        self.snake = [middle, (middle[0] - 1, middle[1]), (middle[0] - 2, middle[1])]
+        self.direction = DIRECTIONS["Right"]
+        self.pending_direction = self.direction
+        self.score = 0
+        self.game_over = False
+        self.food = self.place_food()
+
+    def place_food(self):
+        free = [(x, y) for x in range(self.width) for y in range(self.height) if (x, y) not in self.snake]
+        return self.random.choice(free) if free else None
+
+    def turn(self, direction):
+        """Change direction, ignoring a turn straight back into the snake"""
+        dx, dy = direction
+        if (dx, dy) != (-self.direction[0], -self.direction[1]):
+            self.pending_direction = direction
+
+    def step(self):
+        """Advance the snake one cell; returns False once the game is over"""
+        if self.game_over:
+            return False
+        self.direction = self.pending_direction
+        head_x, head_y = self.snake[0]
+        head = (head_x + self.direction[0], head_y + self.direction[1])
+        hits_wall = not (0 <= head[0] < self.width and 0 <= head[1] < self.height)
+        # The tail moves away this step unless the snake eats, so it is safe to enter
+        body = self.snake if head == self.food else self.snake[:-1]
+        if hits_wall or head in body:
+            self.game_over = True
+            return False
+        self.snake.insert(0, head)
+        if head == self.food:
+            self.score += 1
+            self.food = self.place_food()
+            if self.food is None:
+                self.game_over = True
+                return False
+        else:
+            self.snake.pop()
+        return True
+
+    def autopilot(self):
+        """A simple bot for the demo: head for the food, avoiding immediate collisions"""
+        head_x, head_y = self.snake[0]
+        options = []
+        for direction in DIRECTIONS.values():
+            if direction == (-self.direction[0], -self.direction[1]):
+                continue
+            cell = (head_x + direction[0], head_y + direction[1])
+            if not (0 <= cell[0] < self.width and 0 <= cell[1] < self.height) or cell in self.snake[:-1]:
+                continue
+            distance = abs(cell[0] - self.food[0]) + abs(cell[1] - self.food[1])
+            options.append((distance, direction))
+        if options:
+            self.turn(min(options)[1])
+
+    def render_text(self):
+        rows = []
+        for y in range(self.height):
+            row = ""
+            for x in range(self.width):
+                if (x, y) == self.snake[0]:
+                    row += "@"
+                elif (x, y) in self.snake:
+                    row += "o"
+                elif (x, y) == self.food:
+                    row += "*"
+                else:
+                    row += "."
+            rows.append(row)
+        return "\n".join(rows)
+
+
+def run_gui(tk):
+    game = SnakeGame()
+    root = tk.Tk()
+    root.title("Snake")
+    root.resizable(False, False)
+    score_label = tk.Label(root, text="Score: 0", font=("Helvetica", 14))
+    score_label.pack()
+    canvas = tk.Canvas(root, width=game.width * CELL_SIZE, height=game.height * CELL_SIZE, bg="black",
+                       highlightthickness=0)
+    canvas.pack()
+    state = {"paused": False}
+
+    def draw():
+        canvas.delete("all")
+        if game.food is not None:
+            x, y = game.food
+            canvas.create_oval(x * CELL_SIZE + 3, y * CELL_SIZE + 3, (x + 1) * CELL_SIZE - 3, (y + 1) * CELL_SIZE - 3,
+                               fill="red", outline="")
+        for index, (x, y) in enumerate(game.snake):
+            canvas.create_rectangle(x * CELL_SIZE + 1, y * CELL_SIZE + 1, (x + 1) * CELL_SIZE - 1,
+                                    (y + 1) * CELL_SIZE - 1, fill="lime" if index == 0 else "green", outline="")
+        score_label.config(text=f"Score: {game.score}" + ("  (paused)" if state["paused"] else ""))
+        if game.game_over:
+            canvas.create_text(game.width * CELL_SIZE // 2, game.height * CELL_SIZE // 2, fill="white",
+                               font=("Helvetica", 20, "bold"), text=f"Game over! Score: {game.score}\nPress R to restart",
+                               justify="center")
+
+    def tick():
+        if not state["paused"]:
+            game.step()
+        draw()
+        if not game.game_over:
+            root.after(TICK_MS, tick)
+
+    def on_key(event):
+        key = KEY_ALIASES.get(event.keysym.lower(), event.keysym)
+        if key in DIRECTIONS:
+            game.turn(DIRECTIONS[key])
+        elif key == "space":
+            state["paused"] = not state["paused"]
+        elif key.lower() == "r" and game.game_over:
+            game.reset()
+            tick()
+
+    root.bind("<Key>", on_key)
+    tick()
+    root.mainloop()
+
+
+def run_demo(steps=60, seed=7):
+    """Let the autopilot play without a window, printing the board now and then"""
+    game = SnakeGame(width=12, height=8, seed=seed)
+    print("The snake is playing itself:\n")
+    for step in range(1, steps + 1):
+        game.autopilot()
+        if not game.step():
+            break
+        if step % 20 == 0:
+            print(f"After {step} moves (score {game.score}):")
+            print(game.render_text())
+            print()
+    result = "Game over" if game.game_over else "Demo finished"
+    print(f"{result}. Final score: {game.score}, snake length: {len(game.snake)}")
+
+
+def main():
+    if "--demo" in sys.argv[1:]:
+        run_demo()
+        return
+    try:
+        import tkinter as tk
+        run_gui(tk)
+    except ImportError:
+        print("Tkinter is not installed (on Linux, install the python3-tk package).")
+        run_demo()
+    except tk.TclError:
+        print("No display available, so here is a demo instead.")
+        run_demo()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Todo list
+
+Add tasks, tick them off, delete them and clear the finished ones. The list
+is saved to todo_list.json in the current directory, so it is still there
+the next time the app starts.
+
+Runs in a Tkinter window. Without a display (or with --demo) it walks
+through a short session in the terminal instead, without touching the
+saved list.
+"""
+import json
+import os
+import sys
+
+SAVE_FILE = "todo_list.json"
+
+
+class TodoList:
+    """Tasks and their done state, optionally saved to a JSON file"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.tasks = []
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.tasks = [{"title": str(task["title"]), "done": bool(task.get("done"))} for task in json.load(f)]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Could not read {self.path} ({e}); starting with an empty list")
+            self.tasks = []
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.tasks, f, indent=2)
+        except OSError as e:
+            print(f"Could not save the list to {self.path}: {e}")
+
+    def add(self, title):
+        title = title.strip()
+        if not title:
+            raise ValueError("A task needs a title")
+        self.tasks.append({"title": title, "done": False})
+        self.save()
+
+    def toggle(self, index):
+        self.tasks[index]["done"] = not self.tasks[index]["done"]
+        self.save()
+
+    def remove(self, index):
+        del self.tasks[index]
+        self.save()
+
+    def clear_done(self):
+        removed = sum(1 for task in self.tasks if task["done"])
+        self.tasks = [task for task in self.tasks if not task["done"]]
+        self.save()
+        return removed
+
+    def remaining(self):
+        return sum(1 for task in self.tasks if not task["done"])
+
+    def render_text(self):
+        if not self.tasks:
+            return "  (no tasks)"
+        return "\n".join(f"  {index + 1}. [{'x' if task['done'] else ' '}] {task['title']}"
+                         for index, task in enumerate(self.tasks))
+
+
+def run_gui(tk):
+    todos = TodoList(SAVE_FILE)
+    root = tk.Tk()
+    root.title("Todo List")
+    root.minsize(360, 400)
+
+    entry_frame = tk.Frame(root)
+    entry_frame.pack(fill="x", padx=10, pady=10)
+    entry = tk.Entry(entry_frame, font=("Helvetica", 13))
+    entry.pack(side="left", fill="x", expand=True)
+    listbox = tk.Listbox(root, font=("Helvetica", 13), activestyle="none", selectmode="single")
+    listbox.pack(fill="both", expand=True, padx=10)
+    status = tk.Label(root, anchor="w", fg="gray")
+    status.pack(fill="x", padx=10)
+
+    def refresh(select=None):
+        listbox.delete(0, "end")
+        for task in todos.tasks:
+            listbox.insert("end", ("✔ " if task["done"] else "□ ") + task["title"])
+            if task["done"]:
+                listbox.itemconfig("end", fg="gray")
+        if select is not None and 0 <= select < len(todos.tasks):
+            listbox.selection_set(select)
+        status.config(text=f"{todos.remaining()} of {len(todos.tasks)} tasks left")
+
+    def selected():
+        selection = listbox.curselection()
+        return selection[0] if selection else None
+
+    def add(event=None):
+        try:
+            todos.add(entry.get())
+        except ValueError:
+            return
+        entry.delete(0, "end")
+        refresh()
+
+    def toggle(event=None):
+        index = selected()
+        if index is not None:
+            todos.toggle(index)
+            refresh(index)
+
+    def remove(event=None):
+        index = selected()
+        if index is not None:
+            todos.remove(index)
+            refresh(min(index, len(todos.tasks) - 1))
+
+    def clear_done():
+        todos.clear_done()
+        refresh()
+
+    tk.Button(entry_frame, text="Add", width=6, command=add).pack(side="left", padx=(6, 0))
+    buttons = tk.Frame(root)
+    buttons.pack(fill="x", padx=10, pady=10)
+    tk.Button(buttons, text="Done / Undo", command=toggle).pack(side="left")
+    tk.Button(buttons, text="Delete", command=remove).pack(side="left", padx=6)
+    tk.Button(buttons, text="Clear finished", command=clear_done).pack(side="right")
+
+    entry.bind("<Return>", add)
+    listbox.bind("<Double-Button-1>", toggle)
+    listbox.bind("<space>", toggle)
+    listbox.bind("<Delete>", remove)
+    entry.focus_set()
+    refresh()
+    root.mainloop()
+
+
+def run_demo():
+    """A short session on a list that is never saved"""
+    todos = TodoList()
+    print("Adding three tasks:")
+    for title in ("Buy groceries", "Write the report", "Call the dentist"):
+        todos.add(title)
+    print(todos.render_text())
+    print("\nMarking 'Buy groceries' as done:")
+    todos.toggle(0)
+    print(todos.render_text())
+    print("\nClearing finished tasks:")
+    todos.clear_done()
+    print(todos.render_text())
+    print(f"\n{todos.remaining()} tasks left")
+
+
+def main():
+    if "--demo" in sys.argv[1:]:
+        run_demo()
+        return
+    try:
+        import tkinter as tk
+        run_gui(tk)
+    except ImportError:
+        print("Tkinter is not installed (on Linux, install the python3-tk package).")
+        run_demo()
+    except tk.TclError:
+        print("No display available, so here is a demo instead.")
+        run_demo()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failures that open a breaker, and how long it stays open before a trial call
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+# Outcomes kept for the recent failure rate in health stats
+BREAKER_HEALTH_WINDOW = 50
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose breaker is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} is unavailable (circuit open, next trial in {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Per-backend circuit breaker
+
+    Closed: calls go through and consecutive failures are counted. After
+    `failure_threshold` of them the breaker opens and calls are rejected
+    immediately with CircuitOpenError. Once `reset_timeout` has passed it goes
+    half-open and lets `half_open_max_calls` trial calls through; a success
+    closes it again, a failure re-opens it for another `reset_timeout`.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._recent: deque = deque(maxlen=BREAKER_HEALTH_WINDOW)
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+        self._last_failure: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        # Called with the lock held; an open breaker turns half-open once its timeout has passed
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trials = 0
+            logger.info(f"Circuit {self.name} half-open: allowing a trial call")
+        return self._state
+
+    def before_call(self):
+        """Reserve a call, or raise CircuitOpenError if the backend should be skipped"""
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN or (state == HALF_OPEN and self._trials >= self.half_open_max_calls):
+                self._stats["rejected"] += 1
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+                raise CircuitOpenError(self.name, retry_in)
+            if state == HALF_OPEN:
+                self._trials += 1
+            self._stats["calls"] += 1
+
+    def record_success(self):
+        with self._lock:
+            self._stats["successes"] += 1
+            self._recent.append(True)
+            self._consecutive_failures = 0
+            if self._state != CLOSED:
+                logger.info(f"Circuit {self.name} closed: backend recovered")
+            self._state = CLOSED
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._recent.append(False)
+            self._consecutive_failures += 1
+            if error is not None:
+                self._last_failure = f"{type(error).__name__}: {error}"[:200]
+            state = self._current_state()
+            if state == HALF_OPEN or (state == CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._stats["opened"] += 1
+                logger.warning(f"Circuit {self.name} open after {self._consecutive_failures} consecutive "
+                               f"failure(s); skipping it for {self.reset_timeout:.0f}s")
+
+    def release(self):
+        """End a reserved call without a verdict (e.g. it was cancelled)"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def call(self, fn: Callable[..., Any], *args,
+             is_failure: Optional[Callable[[BaseException], bool]] = None, **kwargs) -> Any:
+        """Call fn through the breaker; exceptions count as failures unless is_failure says otherwise"""
+        self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_failure is None or is_failure(e):
+                self.record_failure(e)
+            else:
+                self.record_success()
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.record_success()
+        return result
+
+    async def acall(self, fn: Callable[..., Any], *args,
+                    is_failure: Optional[Callable[[BaseException], bool]] = None, **kwargs) -> Any:
+        """Async counterpart of call() for coroutine functions"""
+        self.before_call()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            if is_failure is None or is_failure(e):
+                self.record_failure(e)
+            else:
+                self.record_success()
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> Dict:
+        """State, counters and recent failure rate"""
+        with self._lock:
+            state = self._current_state()
+            stats = dict(self._stats)
+            recent = list(self._recent)
+            stats.update(
+                state=state,
+                consecutive_failures=self._consecutive_failures,
+                last_failure=self._last_failure,
+                recent_failure_rate=round(recent.count(False) / len(recent), 3) if recent else None
+            )
+            if state == OPEN:
+                stats["retry_in"] = round(max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 1)
+        return stats
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the process-wide breaker for a backend, creating it on first use"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def breaker_stats() -> Dict[str, Dict]:
+    """Health stats of every breaker created so far"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
@@ -0,0 +1,140 @@
+import re
+import ast
+import logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from static_check import REPORT_HEADER
+
+logger = logging.getLogger(__name__)
+
+FRAME_PATTERN = re.compile(r'^\s*File "(?P<file>[^"]+)", line (?P<line>\d+)(?:, in (?P<func>.+))?\s*$', re.MULTILINE)
+IDENTIFIER_PATTERN = re.compile(r"\b[A-Za-z_][A-Za-z0-9_]*\b")
+
+# Enclosing functions longer than this are cut down to a window around the failing line
+MAX_ENCLOSING_LINES = 80
+WINDOW_LINES = 12
+# Referenced definitions longer than this are left out of the context
+MAX_DEFINITION_LINES = 40
+
+
+class Frame(NamedTuple):
+    """One frame of a Python traceback"""
+    filename: str
+    lineno: int
+    function: Optional[str]
+
+
+def extract_traceback(error_output: str) -> str:
+    """Return the last traceback (or static check report) in the output, dropping pip chatter and other noise
+
+    Output without a recognisable traceback is returned unchanged.
+    """
+    start = max(error_output.rfind("Traceback (most recent call last):"), error_output.rfind(REPORT_HEADER))
+    if start != -1:
+        return error_output[start:].strip()
+    # Syntax errors in the main script are reported without the Traceback header
+    match = None
+    for match in FRAME_PATTERN.finditer(error_output):
+        pass
+    if match is not None:
+        return error_output[match.start():].strip()
+    return error_output
+
+
+def parse_frames(traceback_text: str) -> List[Frame]:
+    """Parse the frames of a traceback, outermost first"""
+    return [
+        Frame(m.group("file"), int(m.group("line")), m.group("func"))
+        for m in FRAME_PATTERN.finditer(traceback_text)
+    ]
+
+
+def script_frames(traceback_text: str) -> List[Frame]:
+    """Frames that point into the executed script rather than into libraries
+
+    The outermost frame of a traceback is always the script being run.
+    """
+    frames = parse_frames(traceback_text)
+    if not frames:
+        return []
+    script = frames[0].filename
+    return [frame for frame in frames if frame.filename == script]
+
+
+def _merge(ranges: List[Tuple[int, int]], gap: int = 2) -> List[Tuple[int, int]]:
+    """Merge overlapping or nearly adjacent 1-based inclusive line ranges"""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + gap + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _node_span(node: ast.AST) -> Tuple[int, int]:
+    """Line span of a node including its decorators"""
+    start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+    return start, node.end_lineno
+
+
+def relevant_line_ranges(code: str, lines: List[int]) -> List[Tuple[int, int]]:
+    """Line ranges needed to fix failures at the given lines
+
+    Covers the imports, the innermost function around each failing line (or a
+    window if that function is long), and short top-level definitions of names
+    used on the failing lines.
+    """
+    source_lines = code.splitlines()
+    total = len(source_lines)
+    lines = [line for line in lines if 1 <= line <= total]
+    if not lines:
+        return []
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        tree = None
+
+    ranges = []
+    if tree is None:
+        # Unparseable code: fall back to plain windows around the failing lines
+        for line in lines:
+            ranges.append((max(1, line - WINDOW_LINES), min(total, line + WINDOW_LINES)))
+        return _merge(ranges)
+
+    functions = [node for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    definitions: Dict[str, Tuple[int, int]] = {}
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            ranges.append(_node_span(node))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            definitions[node.name] = _node_span(node)
+
+    for line in lines:
+        enclosing = [node for node in functions if node.lineno <= line <= node.end_lineno]
+        if enclosing:
+            start, end = _node_span(min(enclosing, key=lambda node: node.end_lineno - node.lineno))
+            if end - start + 1 <= MAX_ENCLOSING_LINES:
+                ranges.append((start, end))
+            else:
+                ranges.append((max(start, line - WINDOW_LINES), min(end, line + WINDOW_LINES)))
+        else:
+            ranges.append((max(1, line - WINDOW_LINES // 2), min(total, line + WINDOW_LINES // 2)))
+
+        for name in set(IDENTIFIER_PATTERN.findall(source_lines[line - 1])):
+            span = definitions.get(name)
+            if span and span[1] - span[0] + 1 <= MAX_DEFINITION_LINES:
+                ranges.append(span)
+
+    return _merge(ranges)
+
+
+def render_excerpts(code: str, ranges: List[Tuple[int, int]]) -> str:
+    """Render line ranges of the code as labelled fenced excerpts"""
+    source_lines = code.splitlines()
+    parts = []
+    for start, end in ranges:
+        excerpt = "\n".join(source_lines[start - 1:end])
+        parts.append(f"# Lines {start}-{end}\n```python\n{excerpt}\n```")
+    return "\n\n".join(parts)
@@ -0,0 +1,138 @@
+import re
+import logging
+from typing import List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MARKER = "<<<<<<< SEARCH"
+DIVIDER_MARKER = "======="
+REPLACE_MARKER = ">>>>>>> REPLACE"
+
+_BLOCK_PATTERN = re.compile(
+    r"^<{5,9} ?SEARCH[^\n]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} ?REPLACE[^\n]*$",
+    re.MULTILINE | re.DOTALL
+)
+_HUNK_HEADER = re.compile(r"^@@.*@@")
+
+
+class Edit(NamedTuple):
+    """A single search/replace edit"""
+    search: str
+    replace: str
+
+
+class PatchError(ValueError):
+    """Raised when model-provided edits cannot be parsed or applied"""
+
+
+def parse_search_replace(text: str) -> List[Edit]:
+    """Parse SEARCH/REPLACE blocks from model output"""
+    return [Edit(search, replace) for search, replace in _BLOCK_PATTERN.findall(text)]
+
+
+def parse_unified_diff(text: str) -> List[Edit]:
+    """Turn the hunks of a unified diff into content-matched edits
+
+    Line numbers in model-written diffs are unreliable, so each hunk is
+    applied by matching its context and removed lines instead.
+    """
+    edits = []
+    search: Optional[List[str]] = None
+    replace: List[str] = []
+
+    def flush():
+        if search is not None and (search or replace):
+            edits.append(Edit("".join(search), "".join(replace)))
+
+    for line in text.splitlines(keepends=True):
+        if _HUNK_HEADER.match(line):
+            flush()
+            search, replace = [], []
+        elif search is None or line.startswith(("---", "+++")):
+            continue
+        elif line.startswith("-"):
+            search.append(line[1:])
+        elif line.startswith("+"):
+            replace.append(line[1:])
+        elif line.startswith(" ") or line in ("\n", "\r\n"):
+            context = line[1:] if line.startswith(" ") else line
+            search.append(context)
+            replace.append(context)
+        elif line.startswith("\\"):
+            # "\ No newline at end of file"
+            continue
+        else:
+            flush()
+            search = None
+    flush()
+    return edits
+
+
+def parse_edits(text: str) -> List[Edit]:
+    """Parse edits in either SEARCH/REPLACE or unified diff format"""
+    edits = parse_search_replace(text)
+    if edits:
+        return edits
+    # Diffs usually arrive inside a ```diff fence; hunks are found either way
+    return parse_unified_diff(text)
+
+
+def _find_loose(lines: List[str], search_lines: List[str]) -> Optional[int]:
+    """Find search_lines in lines ignoring trailing whitespace; returns the start index"""
+    stripped = [line.rstrip() for line in lines]
+    target = [line.rstrip() for line in search_lines]
+    matches = [i for i in range(len(stripped) - len(target) + 1) if stripped[i:i + len(target)] == target]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _find_reindented(lines: List[str], search_lines: List[str]) -> Optional[tuple]:
+    """Find search_lines allowing a uniform indentation difference; returns (start, indent)"""
+    target = [line.strip() for line in search_lines]
+    matches = []
+    for i in range(len(lines) - len(target) + 1):
+        if [line.strip() for line in lines[i:i + len(target)]] == target:
+            first = lines[i]
+            indent = first[:len(first) - len(first.lstrip())]
+            search_indent = search_lines[0][:len(search_lines[0]) - len(search_lines[0].lstrip())]
+            if indent.endswith(search_indent):
+                matches.append((i, indent[:len(indent) - len(search_indent)]))
+    return matches[0] if len(matches) == 1 else None
+
+
+def apply_edit(source: str, edit: Edit) -> str:
+    """Apply one edit, matching exactly first and then progressively more loosely"""
+    if not edit.search.strip():
+        # An empty search means "append"
+        return source.rstrip("\n") + "\n" + edit.replace
+
+    if source.count(edit.search) == 1:
+        return source.replace(edit.search, edit.replace, 1)
+    if source.count(edit.search) > 1:
+        raise PatchError(f"Search text matches {source.count(edit.search)} places: {edit.search[:80]!r}")
+
+    lines = source.splitlines(keepends=True)
+    search_lines = edit.search.splitlines(keepends=True)
+    replace_lines = edit.replace.splitlines(keepends=True)
+    if replace_lines and not replace_lines[-1].endswith("\n"):
+        replace_lines[-1] += "\n"
+
+    start = _find_loose(lines, search_lines)
+    if start is not None:
+        return "".join(lines[:start] + replace_lines + lines[start + len(search_lines):])
+
+    found = _find_reindented(lines, search_lines)
+    if found is not None:
+        start, extra_indent = found
+        reindented = [extra_indent + line if line.strip() else line for line in replace_lines]
+        return "".join(lines[:start] + reindented + lines[start + len(search_lines):])
+
+    raise PatchError(f"Search text not found: {edit.search[:80]!r}")
+
+
+def apply_edits(source: str, edits: List[Edit]) -> str:
+    """Apply edits in order, raising PatchError if any of them does not apply"""
+    if not edits:
+        raise PatchError("No edits found in model output")
+    for edit in edits:
+        source = apply_edit(source, edit)
+    return source
@@ -0,0 +1,67 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Overall time budget for one pipeline request, in seconds
+PIPELINE_DEADLINE = float(os.getenv("PIPELINE_DEADLINE", "180"))
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request's overall time budget has run out"""
+
+
+class Deadline:
+    """Absolute point in time by which a whole request must finish"""
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Per-call timeout: the remaining budget, optionally capped; raises once expired"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Request deadline of {self.budget:.0f}s exceeded")
+        return min(remaining, cap) if cap is not None else remaining
+
+
+# Deadline of the request being processed; asyncio tasks inherit it from their parent
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def call_timeout(cap: Optional[float] = None) -> Optional[float]:
+    """Timeout for the next call under the current deadline (None if there is none)"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return cap
+    return deadline.timeout(cap)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[Deadline]]:
+    """Run a block under a deadline, unless an outer deadline is already tighter"""
+    outer = _current_deadline.get()
+    if seconds is None or (outer is not None and outer.remaining() <= seconds):
+        yield outer
+        return
+    token = _current_deadline.set(Deadline(seconds))
+    try:
+        yield _current_deadline.get()
+    finally:
+        _current_deadline.reset(token)
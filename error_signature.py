@@ -0,0 +1,90 @@
+import os
+import re
+import hashlib
+import logging
+from collections import deque
+from typing import NamedTuple, Optional, Set
+
+from code_context import extract_traceback, script_frames
+
+logger = logging.getLogger(__name__)
+
+# Error signatures a repair loop remembers; hitting any of them again stops the loop
+ERROR_SIGNATURE_HISTORY = int(os.getenv("ERROR_SIGNATURE_HISTORY", "4"))
+
+# Last line of a traceback, e.g. "NameError: name 'x' is not defined" or "KeyboardInterrupt"
+EXCEPTION_PATTERN = re.compile(r"^(?P<type>[A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt|Warning))(?::\s*(?P<message>.*))?$")
+TIMEOUT_PATTERN = re.compile(r"^Execution timed out after")
+# Parts of a message that change from run to run without the error changing
+ADDRESS_PATTERN = re.compile(r"\b0x[0-9a-fA-F]+\b")
+TEMP_PATH_PATTERN = re.compile(r"(?:/[\w.-]+)*/(?:tmp|run_)\w*(?:/[\w.-]+)*\.py")
+
+
+class ErrorSignature(NamedTuple):
+    """What a failure looks like with the run-to-run noise taken out"""
+    error_type: str
+    message: str
+    line: Optional[int]  # failing line of the script, if the traceback names one
+
+
+def _normalize(message: str) -> str:
+    message = ADDRESS_PATTERN.sub("0x?", message)
+    message = TEMP_PATH_PATTERN.sub("<script>", message)
+    return " ".join(message.split())
+
+
+def error_signature(output: str) -> ErrorSignature:
+    """Signature of a failed run's output: exception type, normalized message and failing line
+
+    Works on tracebacks and static check reports alike; output with neither
+    (e.g. a timeout) is keyed on its last line.
+    """
+    traceback_text = extract_traceback(output)
+    frames = script_frames(traceback_text)
+    line = frames[-1].lineno if frames else None
+    lines = [text.strip() for text in traceback_text.splitlines() if text.strip()]
+    for text in reversed(lines):
+        match = EXCEPTION_PATTERN.match(text)
+        if match:
+            return ErrorSignature(match.group("type"), _normalize(match.group("message") or ""), line)
+    last = lines[-1] if lines else ""
+    if TIMEOUT_PATTERN.match(last):
+        return ErrorSignature("Timeout", "execution timed out", None)
+    return ErrorSignature("Error", _normalize(last), line)
+
+
+def code_hash(code: str) -> str:
+    """Hash of the code, ignoring trailing whitespace and blank lines at either end"""
+    normalized = "\n".join(line.rstrip() for line in code.strip("\n").splitlines())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class RepairTracker:
+    """Code and error signatures one repair loop has already been through
+
+    tried() tells the loop a fix is code that already ran (so running it
+    again can only fail the same way), and record() tells it a failure
+    repeats one of the last `history` error signatures, i.e. the debugger
+    is going round in circles.
+    """
+
+    def __init__(self, history: int = ERROR_SIGNATURE_HISTORY):
+        self._code: Set[str] = set()
+        self._signatures: deque = deque(maxlen=max(1, history))
+
+    def tried(self, code: str) -> bool:
+        return code_hash(code) in self._code
+
+    def failed(self, code: str):
+        """Note code that failed without keeping its error, e.g. a losing candidate"""
+        self._code.add(code_hash(code))
+
+    def record(self, code: str, output: str) -> bool:
+        """Note a failed run; returns True if its error signature was seen before"""
+        self.failed(code)
+        signature = error_signature(output)
+        repeated = signature in self._signatures
+        if repeated:
+            logger.info(f"Error repeated: {signature.error_type}: {signature.message} (line {signature.line})")
+        self._signatures.append(signature)
+        return repeated
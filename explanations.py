@@ -0,0 +1,151 @@
+import os
+import asyncio
+import logging
+import contextvars
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from llm_gateway import run_sync
+from response_cache import ResponseCache, make_cache_key
+
+logger = logging.getLogger(__name__)
+
+EXPLANATIONS_DIR = Path(os.getenv("EXPLANATIONS_DIR", ".cache/explanations"))
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+ERROR_PREFIX = "Error generating explanation"
+
+
+class ExplanationStore:
+    """Explanations as lazy artifacts, keyed by a hash of the code they explain
+
+    Pipelines register their code and get an explanation ID back without
+    waiting; the explanation is computed in the background (start()) or on
+    its first request (aget()), stored, and then served by ID. Identical
+    code shares one explanation and one in-flight computation.
+
+    Computations run on the shared runtime loop: call start() and cancel()
+    from coroutines running there.
+    """
+
+    def __init__(self, explain: Callable[[str], Awaitable[str]], store: Optional[ResponseCache] = None):
+        self.explain = explain
+        # The store holds artifacts, not cached responses, so it ignores LLM_CACHE
+        self.store = store or ResponseCache("explanations", directory=EXPLANATIONS_DIR, enabled=True)
+        self._tasks: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def explanation_id(code: str) -> str:
+        return make_cache_key("explanation", code)
+
+    def register(self, code: str) -> str:
+        """Remember the code so its explanation can be computed later; returns its ID"""
+        explanation_id = self.explanation_id(code)
+        if self.store.get(explanation_id) is None:
+            self.store.set(explanation_id, {"code": code, "explanation": None})
+        return explanation_id
+
+    def put(self, code: str, explanation: str) -> str:
+        """Store an explanation computed elsewhere (e.g. in a batch); returns its ID"""
+        explanation_id = self.explanation_id(code)
+        self.store.set(explanation_id, {"code": code, "explanation": explanation})
+        return explanation_id
+
+    def start(self, code: str) -> str:
+        """Register the code and start explaining it in the background; returns its ID"""
+        explanation_id = self.register(code)
+        self._ensure_task(explanation_id, code)
+        return explanation_id
+
+    def cancel(self, code: str):
+        """Stop explaining code that is no longer needed, e.g. a candidate a repair replaced"""
+        task = self._tasks.get(self.explanation_id(code))
+        if task is not None and not task.done():
+            logger.info("Cancelling explanation of replaced code")
+            task.cancel()
+
+    def peek(self, explanation_id: str) -> Optional[str]:
+        """The explanation if it is ready, without starting or waiting for it"""
+        entry = self.store.get(explanation_id)
+        return entry.get("explanation") if entry else None
+
+    def get(self, explanation_id: str, wait: float = 0) -> Optional[Dict]:
+        return run_sync(self.aget(explanation_id, wait))
+
+    async def aget(self, explanation_id: str, wait: float = 0) -> Optional[Dict]:
+        """Status and explanation for an ID, starting it if needed; None if the ID is unknown
+
+        Waits up to `wait` seconds for an explanation that isn't ready yet.
+        """
+        entry = self.store.get(explanation_id)
+        if entry is None:
+            return None
+        if entry.get("explanation") is None:
+            task = self._ensure_task(explanation_id, entry["code"])
+            if wait > 0:
+                try:
+                    entry = await asyncio.wait_for(asyncio.shield(task), wait)
+                except asyncio.TimeoutError:
+                    pass
+                except asyncio.CancelledError:
+                    # Only a cancelled speculative run is swallowed, never our own cancellation
+                    if not task.cancelled():
+                        raise
+        return self._status(explanation_id, entry)
+
+    async def aexplain(self, code: str) -> str:
+        """Explain code now, reusing a stored or in-flight explanation of the same code"""
+        while True:
+            explanation_id = self.start(code)
+            task = self._tasks.get(explanation_id)
+            if task is None:
+                entry = self.store.get(explanation_id)
+                break
+            try:
+                entry = await asyncio.shield(task)
+                break
+            except asyncio.CancelledError:
+                # A pipeline cancelled the run it had started; start another
+                if not task.cancelled():
+                    raise
+        return entry.get("explanation") or entry.get("error") or ERROR_PREFIX
+
+    def _ensure_task(self, explanation_id: str, code: str) -> Optional[asyncio.Future]:
+        entry = self.store.get(explanation_id)
+        if entry is not None and entry.get("explanation"):
+            return None
+        task = self._tasks.get(explanation_id)
+        if task is None:
+            # Created in an empty context so it outlives the request that started it: a task
+            # inherits contextvars, which would hand it that pipeline's deadline and progress
+            task = contextvars.Context().run(asyncio.ensure_future, self._run(explanation_id, code))
+            self._tasks[explanation_id] = task
+        return task
+
+    async def _run(self, explanation_id: str, code: str) -> Dict:
+        try:
+            explanation = await self.explain(code)
+            if explanation.startswith(ERROR_PREFIX):
+                # Left unexplained, so the next request tries again
+                entry = {"code": code, "explanation": None, "error": explanation}
+            else:
+                entry = {"code": code, "explanation": explanation}
+            self.store.set(explanation_id, entry)
+            return entry
+        finally:
+            self._tasks.pop(explanation_id, None)
+
+    def _status(self, explanation_id: str, entry: Dict) -> Dict:
+        if entry.get("explanation"):
+            status = READY
+        elif explanation_id in self._tasks:
+            status = PENDING
+        else:
+            status = FAILED if entry.get("error") else PENDING
+        status_entry = {"explanation_id": explanation_id, "status": status, "explanation": entry.get("explanation")}
+        if status == FAILED:
+            status_entry["error"] = entry["error"]
+        return status_entry
@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from explanations import ERROR_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# Curated programs served without running the pipeline
+CATALOG_DIR = Path(os.getenv("CATALOG_DIR", Path(__file__).resolve().parent / "catalog"))
+MANIFEST_NAME = "catalog.json"
+FAST_PATH = os.getenv("FAST_PATH", "true").lower() in ("1", "true", "yes")
+# Seconds between background re-verifications of the catalog; 0 turns them off
+CATALOG_REFRESH_INTERVAL = float(os.getenv("CATALOG_REFRESH_INTERVAL", "0"))
+# Longest a catalog program's demo may run while it is verified
+CATALOG_VERIFY_TIMEOUT = 30
+
+# Words that say how something is asked for rather than what is wanted; they
+# never stop a request from matching an entry
+REQUEST_WORDS = frozenset("""
+    a an the me my us our i we you your it this that some one
+    can could would will should want need like let lets s
+    build create make write generate code program implement develop give show do
+    for of in with using and to please
+    python py script application app simple basic small little quick new
+""".split())
+
+
+class CatalogEntry(NamedTuple):
+    """One curated program and what it is known to do"""
+    entry_id: str
+    version: int
+    title: str
+    filename: str
+    phrases: Tuple[Tuple[str, ...], ...]  # any one of these names the entry's intent
+    words: FrozenSet[str]  # further words a matching request may use
+    code: str
+    output: str
+    explanation: str
+
+
+def code_digest(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def _find(words: List[str], phrase: Tuple[str, ...]) -> int:
+    """Index of the phrase in the words, or -1"""
+    for index in range(len(words) - len(phrase) + 1):
+        if tuple(words[index:index + len(phrase)]) == phrase:
+            return index
+    return -1
+
+
+class Catalog:
+    """Versioned, verified programs for the request types the app advertises
+
+    The manifest (catalog.json) lists each program's file, version, SHA-256,
+    the output of its verified demo run and a curated explanation. Only
+    entries whose file still matches its recorded hash, and that passed
+    their last verification, are served.
+
+    match() is a local intent matcher: a request matches an entry when it
+    names one of the entry's phrases and every other word is either a
+    request word ("build me a ...") or one of the entry's own words. Anything
+    more specific ("snake game with levels using pygame") falls through to
+    the pipeline, which can honour it.
+    """
+
+    def __init__(self, directory: Path = CATALOG_DIR):
+        self.directory = Path(directory)
+        self.version = 0
+        self._manifest: Dict = {"version": 0, "entries": []}
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._withdrawn: Dict[str, str] = {}  # entry ID -> why it isn't served
+        self._lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._stats = {"matches": 0, "misses": 0, "refreshes": 0}
+        self.load()
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.directory / MANIFEST_NAME
+
+    def load(self):
+        """Read the manifest, keeping the entries whose files match their recorded hash"""
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            logger.info(f"No program catalog at {self.manifest_path}")
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read the program catalog: {e}")
+            return
+
+        entries, withdrawn = {}, {}
+        for record in manifest.get("entries", []):
+            entry_id = record["id"]
+            try:
+                code = (self.directory / record["file"]).read_text(encoding="utf-8")
+            except OSError as e:
+                withdrawn[entry_id] = f"program missing: {e}"
+                continue
+            if not record.get("verified") or not record.get("sha256") or not record.get("explanation"):
+                withdrawn[entry_id] = "not verified"
+                continue
+            if code_digest(code) != record["sha256"]:
+                withdrawn[entry_id] = "program changed since it was verified"
+                continue
+            entries[entry_id] = CatalogEntry(
+                entry_id=entry_id,
+                version=int(record["version"]),
+                title=record["title"],
+                filename=record["file"],
+                phrases=tuple(tuple(phrase.split()) for phrase in record["phrases"]),
+                words=frozenset(record.get("words", [])),
+                code=code,
+                output=record.get("output", ""),
+                explanation=record["explanation"]
+            )
+        for entry_id, reason in withdrawn.items():
+            logger.warning(f"Catalog entry {entry_id!r} is not served: {reason}")
+        with self._lock:
+            self._manifest = manifest
+            self.version = manifest.get("version", 0)
+            self._entries = entries
+            self._withdrawn = withdrawn
+        logger.info(f"Loaded program catalog v{self.version} with {len(entries)} verified entries")
+
+    def entries(self) -> List[CatalogEntry]:
+        with self._lock:
+            return [entry for entry_id, entry in self._entries.items() if entry_id not in self._withdrawn]
+
+    def match(self, normalized_text: str) -> Optional[CatalogEntry]:
+        """The one entry a normalized transcript asks for, or None"""
+        words = normalized_text.split()
+        matches = []
+        for entry in self.entries():
+            for phrase in entry.phrases:
+                index = _find(words, phrase)
+                if index == -1:
+                    continue
+                rest = words[:index] + words[index + len(phrase):]
+                if all(word in REQUEST_WORDS or word in entry.words for word in rest):
+                    matches.append(entry)
+                break
+        with self._lock:
+            self._stats["matches" if len(matches) == 1 else "misses"] += 1
+        return matches[0] if len(matches) == 1 else None
+
+    async def averify(self, code: str) -> Tuple[bool, str]:
+        """Run a program's headless demo (`--demo`) in a scratch directory; returns (success, output)"""
+        workdir = tempfile.mkdtemp(prefix="catalog_")
+        try:
+            path = os.path.join(workdir, "program.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(code)
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, path, "--demo", cwd=workdir,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+            )
+            try:
+                stdout, _ = await asyncio.wait_for(process.communicate(), CATALOG_VERIFY_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                return False, f"Demo timed out after {CATALOG_VERIFY_TIMEOUT} seconds"
+            return process.returncode == 0, stdout.decode("utf-8", errors="replace")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    async def arefresh(self, explain: Optional[Callable[[str], Awaitable[str]]] = None,
+                       save: bool = False) -> Dict[str, str]:
+        """Re-verify every entry; returns each entry's outcome
+
+        A program that no longer passes is withdrawn until a later refresh
+        sees it pass again. With `save`, the manifest is rewritten: changed
+        programs get a new version, hash and output, and `explain` (if given)
+        writes the explanation of any program that changed or lacks one.
+        """
+        with self._lock:
+            manifest = json.loads(json.dumps(self._manifest))
+        outcomes = {}
+        for record in manifest.get("entries", []):
+            entry_id = record["id"]
+            try:
+                code = (self.directory / record["file"]).read_text(encoding="utf-8")
+            except OSError as e:
+                outcomes[entry_id] = f"missing: {e}"
+                continue
+            success, output = await self.averify(code)
+            digest = code_digest(code)
+            # An entry without a hash is new rather than changed
+            changed = record.get("sha256") not in (None, digest)
+            if not success:
+                outcomes[entry_id] = "failed"
+                logger.warning(f"Catalog entry {entry_id!r} failed verification:\n{output}")
+                with self._lock:
+                    self._withdrawn[entry_id] = "failed verification"
+                if save:
+                    record["verified"] = None
+                continue
+            outcomes[entry_id] = "changed" if changed else "verified"
+            with self._lock:
+                if self._withdrawn.get(entry_id) == "failed verification":
+                    logger.info(f"Catalog entry {entry_id!r} passes again")
+                    del self._withdrawn[entry_id]
+            if save:
+                if changed:
+                    record["version"] = record.get("version", 0) + 1
+                    record["explanation"] = None
+                record["sha256"] = digest
+                if explain is not None and not record.get("explanation"):
+                    explanation = await explain(code)
+                    # Left empty on failure, which keeps the entry from being served
+                    record["explanation"] = None if explanation.startswith(ERROR_PREFIX) else explanation
+                record["output"] = output
+                record["verified"] = time.strftime("%Y-%m-%d")
+                record["python"] = "{}.{}".format(*sys.version_info[:2])
+        with self._lock:
+            self._stats["refreshes"] += 1
+        if save:
+            if any(outcome == "changed" for outcome in outcomes.values()):
+                manifest["version"] = manifest.get("version", 0) + 1
+            with open(self.manifest_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2, ensure_ascii=False)
+                f.write("\n")
+            self.load()
+        return outcomes
+
+    def start_refresh(self, interval: float = CATALOG_REFRESH_INTERVAL,
+                      run: Callable[[Awaitable], object] = asyncio.run):
+        """Re-verify the catalog every `interval` seconds on a daemon thread (idempotent; 0 disables it)
+
+        `run` drives the coroutine, e.g. the shared runtime's run_sync.
+        """
+        if interval <= 0 or self._refresher is not None:
+            return
+
+        def refresh_forever():
+            while True:
+                time.sleep(interval)
+                try:
+                    run(self.arefresh())
+                except Exception:
+                    logger.exception("Catalog refresh failed")
+
+        self._refresher = threading.Thread(target=refresh_forever, name="catalog-refresh", daemon=True)
+        self._refresher.start()
+        logger.info(f"Re-verifying the program catalog every {interval:.0f}s")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, version=self.version, served=sorted(set(self._entries) - set(self._withdrawn)),
+                        withdrawn=dict(self._withdrawn))
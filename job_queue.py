@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Type
+
+logger = logging.getLogger(__name__)
+
+# Job settings, overridable through the environment
+JOB_DB_PATH = Path(os.getenv("JOB_DB_PATH", ".cache/jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Queued plus running jobs allowed before submissions are refused
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "32"))
+# Finished jobs are deleted once they are older than this
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(24 * 3600)))
+JOB_PRUNE_INTERVAL = 600
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+# Error kind of a failed job whose exception type has no registered kind
+INTERNAL_ERROR = "internal"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    error_kind TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+
+class QueueFull(RuntimeError):
+    """Raised by submit() when the queue is at its depth limit"""
+
+    def __init__(self, depth: int):
+        super().__init__(f"Job queue is full ({depth} jobs queued or running), try again later")
+        self.depth = depth
+
+
+class JobQueue:
+    """Background jobs run by a bounded worker pool and persisted in SQLite
+
+    submit() records a job and returns its ID straight away; one of
+    `workers` threads later calls the handler registered for the job's kind
+    with the job ID and payload, and stores the result (or the error). Once
+    `max_depth` jobs are queued or running, submit() raises QueueFull so
+    callers can push back. Jobs still queued or running when the process stopped are
+    re-queued by start(). A failed job records its error and an error kind,
+    looked up from the exception type with register_error(). The database is
+    opened on first use, so creating a queue touches no files.
+    """
+
+    def __init__(self, db_path: Path = JOB_DB_PATH, workers: int = JOB_WORKERS,
+                 max_depth: int = JOB_QUEUE_DEPTH, retention: float = JOB_RETENTION):
+        self.db_path = Path(db_path)
+        self.workers = workers
+        self.max_depth = max_depth
+        self.retention = retention
+        self._handlers: Dict[str, Callable[[str, Dict], Any]] = {}
+        self._error_kinds: Dict[Type[BaseException], str] = {}
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._pending = 0
+        self._threads = []
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+        self._last_prune = 0.0
+        self._stats = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0, "recovered": 0}
+        self._db: Optional[sqlite3.Connection] = None
+
+    def register(self, kind: str, handler: Callable[[str, Dict], Any]):
+        """Run jobs of this kind with handler(job_id, payload); its return value must be JSON-serializable"""
+        self._handlers[kind] = handler
+
+    def register_error(self, error_type: Type[BaseException], error_kind: str):
+        """Record `error_kind` on jobs that fail with this exception type (or a subclass)"""
+        self._error_kinds[error_type] = error_kind
+
+    def _open(self):
+        # Called with the lock held
+        if self._db is not None:
+            return
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        # Tables created before error kinds were recorded lack the column
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "error_kind" not in columns:
+            with self._db:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN error_kind TEXT")
+
+    def start(self):
+        """Re-queue unfinished jobs from a previous run and start the workers (idempotent)"""
+        with self._lock:
+            if self._threads:
+                return
+            self._open()
+            self._prune()
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created", (QUEUED, RUNNING)
+            ).fetchall()
+            with self._db:
+                self._db.execute("UPDATE jobs SET status = ?, started = NULL WHERE status = ?", (QUEUED, RUNNING))
+            for row in rows:
+                self._queue.put(row["id"])
+            self._pending += len(rows)
+            self._stats["recovered"] += len(rows)
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        if rows:
+            logger.info(f"Re-queued {len(rows)} unfinished job(s) from the previous run")
+
+    def submit(self, kind: str, payload: Dict) -> Dict:
+        """Queue a job and return it; raises QueueFull at the depth limit"""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind {kind!r}")
+        self.start()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            if self._pending >= self.max_depth:
+                self._stats["rejected"] += 1
+                raise QueueFull(self._pending)
+            with self._db:
+                self._db.execute(
+                    "INSERT INTO jobs (id, kind, payload, status, created) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, kind, json.dumps(payload), QUEUED, time.time())
+                )
+            self._pending += 1
+            self._stats["submitted"] += 1
+            job = self._get(job_id)
+        self._queue.put(job_id)
+        logger.info(f"Queued {kind} job {job_id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """The job's status, and its result or error once finished; None if unknown"""
+        with self._lock:
+            self._open()
+            return self._get(job_id)
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """Like get(), but blocks for up to `timeout` seconds while the job is unfinished"""
+        deadline = time.monotonic() + timeout
+        with self._finished:
+            self._open()
+            job = self._get(job_id)
+            while job is not None and job["status"] not in FINISHED:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._finished.wait(remaining)
+                job = self._get(job_id)
+            return job
+
+    def _get(self, job_id: str) -> Optional[Dict]:
+        # Called with the lock held
+        row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "created": row["created"],
+            "started": row["started"],
+            "finished": row["finished"]
+        }
+        if row["status"] == SUCCEEDED:
+            job["result"] = json.loads(row["result"])
+        elif row["status"] == FAILED:
+            job["error"] = row["error"]
+            job["error_kind"] = row["error_kind"] or INTERNAL_ERROR
+        return job
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                row = self._db.execute("SELECT kind, payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is not None:
+                    with self._db:
+                        self._db.execute("UPDATE jobs SET status = ?, started = ? WHERE id = ?",
+                                         (RUNNING, time.time(), job_id))
+            if row is None:
+                # Pruned or deleted while it waited
+                self._done(job_id, None, None, None, counted=False)
+                continue
+
+            logger.info(f"Running {row['kind']} job {job_id}")
+            try:
+                result = json.dumps(self._handlers[row["kind"]](job_id, json.loads(row["payload"])))
+            except BaseException as e:
+                # Includes a cancelled run_sync future: the job must not stay RUNNING with its slot taken
+                logger.exception(f"Job {job_id} failed")
+                self._done(job_id, None, str(e) or type(e).__name__, self._error_kind(e))
+                if isinstance(e, (KeyboardInterrupt, SystemExit)):
+                    raise
+            else:
+                self._done(job_id, result, None, None)
+
+    def _error_kind(self, error: BaseException) -> str:
+        for error_type, error_kind in self._error_kinds.items():
+            if isinstance(error, error_type):
+                return error_kind
+        return INTERNAL_ERROR
+
+    def _done(self, job_id: str, result: Optional[str], error: Optional[str], error_kind: Optional[str],
+              counted: bool = True):
+        status = FAILED if error is not None else SUCCEEDED
+        with self._finished:
+            if counted:
+                with self._db:
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, result = ?, error = ?, error_kind = ?, finished = ? WHERE id = ?",
+                        (status, result, error, error_kind, time.time(), job_id)
+                    )
+                self._stats[status] += 1
+            self._pending -= 1
+            if time.time() - self._last_prune > JOB_PRUNE_INTERVAL:
+                self._prune()
+            self._finished.notify_all()
+
+    def _prune(self):
+        # Called with the lock held
+        self._last_prune = time.time()
+        with self._db:
+            deleted = self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?",
+                (SUCCEEDED, FAILED, self._last_prune - self.retention)
+            ).rowcount
+        if deleted:
+            logger.info(f"Pruned {deleted} finished job(s) older than {self.retention:.0f}s")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, pending=self._pending, max_depth=self.max_depth, workers=self.workers)
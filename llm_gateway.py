@@ -0,0 +1,752 @@
+import os
+import json
+import time
+import queue
+import asyncio
+import logging
+import threading
+import weakref
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from response_cache import ResponseCache, make_cache_key
+from token_budget import count_prompt_tokens, fit_max_tokens
+from rate_limit import RateLimiter, backoff_delay, retry_after_seconds
+from deadline import DeadlineExceeded, call_timeout, current_deadline
+from circuit_breaker import OPEN, CircuitBreaker, get_breaker
+
+logger = logging.getLogger(__name__)
+
+# Try to import OpenAI with new client format first
+try:
+    import httpx
+    from openai import APIConnectionError, AsyncOpenAI, InternalServerError, NotFoundError, OpenAI, RateLimitError
+    USE_NEW_OPENAI = True
+    logger.info("Using new OpenAI client")
+except ImportError:
+    # Fall back to old format
+    import openai
+    USE_NEW_OPENAI = False
+    logger.info("Using legacy OpenAI package")
+
+# HTTP/2 lets several completions share one TLS connection, but needs the optional h2 package
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Connection pool settings, overridable through the environment
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "300"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "5"))
+LLM_WARM_CONNECTIONS = int(os.getenv("LLM_WARM_CONNECTIONS", "4"))
+
+# Hedged requests fire a duplicate once the first exceeds this latency percentile
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Hedge delays used until enough latency samples have been seen
+DEFAULT_HEDGE_DELAYS = {"ttft": 5.0, "total": 60.0}
+
+# Batch API polling
+LLM_BATCH_POLL_INTERVAL = float(os.getenv("LLM_BATCH_POLL_INTERVAL", "30"))
+BATCH_TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+T = TypeVar("T")
+_STREAM_DONE = object()
+
+
+class AsyncRuntime:
+    """Long-lived background event loop that the synchronous API runs coroutines on
+
+    Keeping one loop for the life of the process lets the async connection pool
+    survive between synchronous calls.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="llm-runtime", daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def submit(self, coro: Awaitable[T]):
+        """Schedule a coroutine on the runtime loop and return a concurrent future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable[T]) -> T:
+        """Run a coroutine on the runtime loop and block until it finishes"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None and running is self._loop:
+            coro.close()
+            raise RuntimeError("Blocking call made from the runtime loop; await the async API instead")
+        return self.submit(coro).result()
+
+
+runtime = AsyncRuntime()
+
+
+class LatencyTracker:
+    """Rolling latency samples per (model, kind) used to pick hedge delays"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, kind: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault((model, kind), deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model: str, kind: str, fraction: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get((model, kind), ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def hedge_delay(self, model: str, kind: str) -> float:
+        """Seconds to wait before hedging: the observed p95, or a default until enough samples exist"""
+        with self._lock:
+            count = len(self._samples.get((model, kind), ()))
+        if count < LLM_HEDGE_MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAYS[kind]
+        return self.percentile(model, kind, LLM_HEDGE_PERCENTILE)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            keys = list(self._samples)
+        return {
+            f"{model}/{kind}": {
+                "samples": len(self._samples[(model, kind)]),
+                "p50": round(self.percentile(model, kind, 0.5), 3),
+                "p95": round(self.percentile(model, kind, 0.95), 3)
+            }
+            for model, kind in keys
+        }
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """Run a coroutine from synchronous code on the shared runtime loop"""
+    return runtime.run(coro)
+
+
+class LLMGateway:
+    """Shared gateway that owns the OpenAI clients and their HTTP connection pools"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 max_connections: int = LLM_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = LLM_MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY,
+                 cache: Optional[ResponseCache] = None,
+                 limiter: Optional[RateLimiter] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 whisper_breaker: Optional[CircuitBreaker] = None):
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
+        # Local stand-ins selected through the base URL don't check the key
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY") or ("stand-in" if self.base_url else None)
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.cache = cache if cache is not None else ResponseCache("llm")
+        self.limiter = limiter or RateLimiter()
+        # Chat and transcription endpoints fail independently, so each has its own breaker
+        self.breaker = breaker or get_breaker("openai")
+        self.whisper_breaker = whisper_breaker or get_breaker("whisper")
+        self.latency = LatencyTracker()
+        self._hedge_stats = {"hedged": 0, "backup_won": 0}
+        self._client = None
+        self._client_lock = threading.Lock()
+        # httpx async pools are bound to the event loop that created them
+        self._async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    @property
+    def client(self):
+        """Lazily build the pooled synchronous OpenAI client on first use"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._build_client()
+        return self._client
+
+    def _build_client(self):
+        """Create the OpenAI client backed by a tuned keep-alive connection pool"""
+        if not USE_NEW_OPENAI:
+            openai.api_key = self.api_key
+            if self.base_url:
+                openai.api_base = self.base_url
+            return openai
+
+        http_client = httpx.Client(
+            limits=self._limits(),
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            http2=HTTP2_AVAILABLE
+        )
+        return OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=http_client,
+            max_retries=0
+        )
+
+    @property
+    def async_client(self):
+        """Return the pooled async client for the running event loop"""
+        if not USE_NEW_OPENAI:
+            return self.client
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            http_client = httpx.AsyncClient(
+                limits=self._limits(),
+                timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+                http2=HTTP2_AVAILABLE
+            )
+            client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=http_client,
+                # Retries are handled by the gateway so 429s feed the rate limiter
+                max_retries=0
+            )
+            self._async_clients[loop] = client
+            logger.info(f"Built pooled OpenAI client (max_connections={self.max_connections}, "
+                        f"keepalive={self.max_keepalive_connections}, http2={HTTP2_AVAILABLE})")
+        return client
+
+    def preflight(self, model: str, system_prompt: str, user_prompt: str, max_tokens: int) -> int:
+        """Count prompt tokens locally and size max_tokens to fit the context window"""
+        prompt_tokens = count_prompt_tokens(model, system_prompt, user_prompt)
+        fitted = fit_max_tokens(model, prompt_tokens, max_tokens)
+        logger.debug(f"Preflight for {model}: {prompt_tokens} prompt tokens, max_tokens={fitted}")
+        return fitted
+
+    async def acomplete(self, system_prompt: str, user_prompt: str, model: str,
+                        temperature: float = 0.2, max_tokens: int = 4000,
+                        use_cache: bool = True, hedge: bool = False) -> str:
+        """Run a chat completion and return the message content
+
+        Identical (model, prompts, temperature, max_tokens) calls are answered
+        from the response cache unless `use_cache` is False. `max_tokens` is
+        clamped to the room the prompt leaves in the model's context, and
+        PromptTooLargeError is raised before any request if there is none.
+        """
+        max_tokens = self.preflight(model, system_prompt, user_prompt, max_tokens)
+        cache_key = make_cache_key(model, system_prompt, user_prompt, temperature, max_tokens)
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"LLM response cache hit for {model}")
+                return cached
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        content = await self.achat(messages, model=model, temperature=temperature,
+                                   max_tokens=max_tokens, hedge=hedge)
+        if use_cache and content:
+            self.cache.set(cache_key, content)
+        return content
+
+    async def achat(self, messages: List[Dict], model: str, temperature: float = 0.2,
+                    max_tokens: int = 4000, hedge: bool = False) -> str:
+        """Run a chat completion over an explicit message list
+
+        The call is bounded by the current request deadline. With `hedge`, a
+        duplicate request is sent once the first exceeds the model's p95
+        latency, and whichever answers first is used.
+        """
+        timeout = call_timeout()
+
+        def call():
+            return self._achat(messages, model, temperature, max_tokens, timeout)
+
+        try:
+            if hedge:
+                return await asyncio.wait_for(self._hedged(call, self.latency.hedge_delay(model, "total")), timeout)
+            return await asyncio.wait_for(call(), timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Request deadline reached while waiting for {model}")
+
+    async def _achat(self, messages: List[Dict], model: str, temperature: float,
+                     max_tokens: int, timeout: Optional[float]) -> str:
+        """Send one chat completion through the rate limiter and record its latency"""
+        async def request():
+            started = time.monotonic()
+            if USE_NEW_OPENAI:
+                response = await self.async_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    **self._timeout_kwargs(timeout)
+                )
+            else:
+                response = await self.client.ChatCompletion.acreate(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+            self.latency.record(model, "total", time.monotonic() - started)
+            return response
+
+        estimated_tokens = count_prompt_tokens(model, *[m["content"] for m in messages]) + max_tokens
+        response = await self._send(request, estimated_tokens)
+        usage = getattr(response, "usage", None)
+        completion_tokens = getattr(usage, "completion_tokens", None) if usage else None
+        unused_tokens = max_tokens - completion_tokens if completion_tokens is not None else 0
+        self.limiter.release(success=True, unused_tokens=unused_tokens)
+        return response.choices[0].message.content
+
+    @staticmethod
+    def _timeout_kwargs(timeout: Optional[float]) -> Dict:
+        """Per-request timeout argument for the OpenAI client, if a deadline applies"""
+        return {"timeout": timeout} if timeout is not None else {}
+
+    async def _hedged(self, call: Callable[[], Awaitable[T]], delay: float) -> T:
+        """Run call(); if it hasn't finished after `delay`, race a duplicate against it"""
+        primary = asyncio.ensure_future(call())
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        logger.info(f"LLM request slower than {delay:.1f}s, sending hedged duplicate")
+        self._hedge_stats["hedged"] += 1
+        backup = asyncio.ensure_future(call())
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self._hedge_stats["backup_won"] += 1
+                        return task.result()
+            # Both attempts failed: surface the original request's error
+            return primary.result()
+        finally:
+            for task in (primary, backup):
+                if not task.done():
+                    task.cancel()
+
+    async def _send(self, request, estimated_tokens: int):
+        """Send a request under the rate limiter, retrying 429s and transient failures
+
+        On success the limiter slot is still held; the caller must release it.
+        While the OpenAI circuit breaker is open, CircuitOpenError is raised
+        straight away instead of waiting on a backend that is down.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                await self.limiter.acquire(estimated_tokens)
+            except BaseException:
+                self.breaker.release()
+                raise
+            try:
+                response = await request()
+            except Exception as e:
+                self.limiter.release(success=False)
+                if self._is_backend_failure(e):
+                    self.breaker.record_failure(e)
+                else:
+                    self.breaker.record_success()
+                delay = self._retry_delay(e, attempt)
+                if delay is None or self.breaker.state == OPEN:
+                    raise
+                deadline = current_deadline()
+                if deadline is not None and delay >= deadline.remaining():
+                    logger.warning(f"LLM call failed ({type(e).__name__}) with no time left to retry")
+                    raise
+                attempt += 1
+                logger.warning(f"LLM call failed ({type(e).__name__}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except BaseException:
+                # Cancelled (deadline, lost hedge race): free the slots without judging the backend
+                self.limiter.release(success=False)
+                self.breaker.release()
+                raise
+            else:
+                self.breaker.record_success()
+                return response
+
+    @staticmethod
+    def _is_backend_failure(error: Exception) -> bool:
+        """Errors that say the backend is down or failing, as opposed to rejecting this request"""
+        if not USE_NEW_OPENAI:
+            return True
+        return isinstance(error, (APIConnectionError, InternalServerError))
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying a failed call, or None to give up"""
+        if not USE_NEW_OPENAI:
+            return None
+        if isinstance(error, RateLimitError):
+            if getattr(error, "code", None) == "insufficient_quota":
+                # Out of quota: waiting won't help
+                return None
+            retry_after = retry_after_seconds(error)
+            self.limiter.on_rate_limited(retry_after)
+            if attempt >= LLM_RATE_LIMIT_RETRIES:
+                return None
+            return retry_after if retry_after else backoff_delay(attempt, base=1.0)
+        if isinstance(error, (APIConnectionError, InternalServerError)):
+            if attempt >= LLM_MAX_RETRIES:
+                return None
+            return backoff_delay(attempt)
+        return None
+
+    async def astream(self, system_prompt: str, user_prompt: str, model: str,
+                      temperature: float = 0.2, max_tokens: int = 4000,
+                      hedge: bool = False) -> AsyncIterator[str]:
+        """Stream a chat completion, yielding content deltas as they arrive
+
+        Closing the iterator early closes the underlying HTTP response, which
+        cancels the rest of the completion. With `hedge`, a duplicate stream is
+        opened if the first token is slower than the model's p95, and the
+        stream that starts first is kept.
+        """
+        max_tokens = self.preflight(model, system_prompt, user_prompt, max_tokens)
+        timeout = call_timeout()
+
+        def open_stream():
+            return self._astream(system_prompt, user_prompt, model, temperature, max_tokens, timeout)
+
+        if hedge:
+            stream = await self._hedged_stream(open_stream, self.latency.hedge_delay(model, "ttft"))
+        else:
+            stream = open_stream()
+        deadline = current_deadline()
+        try:
+            async for delta in stream:
+                if deadline is not None and deadline.expired:
+                    raise DeadlineExceeded(f"Request deadline reached while streaming from {model}")
+                yield delta
+        finally:
+            await stream.aclose()
+
+    async def _hedged_stream(self, open_stream: Callable[[], AsyncIterator[str]],
+                             delay: float) -> AsyncIterator[str]:
+        """Open a stream; if its first delta is slower than `delay`, race a duplicate"""
+        streams = {}
+        primary = open_stream()
+        first = asyncio.ensure_future(primary.__anext__())
+        streams[first] = primary
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if not done:
+            logger.info(f"First token slower than {delay:.1f}s, opening hedged duplicate stream")
+            self._hedge_stats["hedged"] += 1
+            backup = open_stream()
+            streams[asyncio.ensure_future(backup.__anext__())] = backup
+
+        winner, first_delta = None, None
+        pending = set(streams)
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        winner = streams[task]
+                        first_delta = task.result() if error is None else None
+                        break
+            if winner is None:
+                # Every stream failed: surface the original request's error
+                first.result()
+            if winner is not primary:
+                self._hedge_stats["backup_won"] += 1
+        finally:
+            for task, stream in streams.items():
+                if stream is winner:
+                    continue
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await stream.aclose()
+
+        async def chained():
+            try:
+                if first_delta is not None:
+                    yield first_delta
+                async for delta in winner:
+                    yield delta
+            finally:
+                await winner.aclose()
+
+        return chained()
+
+    async def _astream(self, system_prompt: str, user_prompt: str, model: str, temperature: float,
+                       max_tokens: int, timeout: Optional[float]) -> AsyncIterator[str]:
+        """Open one streamed completion through the rate limiter, recording time to first token"""
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        started = time.monotonic()
+
+        def request():
+            if USE_NEW_OPENAI:
+                return self.async_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    **self._timeout_kwargs(timeout)
+                )
+            return self.client.ChatCompletion.acreate(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True
+            )
+
+        estimated_tokens = count_prompt_tokens(model, system_prompt, user_prompt) + max_tokens
+        response = await self._send(request, estimated_tokens)
+        # The limiter slot stays held until the stream is finished or abandoned
+        success = False
+        first_token = True
+        try:
+            if USE_NEW_OPENAI:
+                try:
+                    async for chunk in response:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            if first_token:
+                                self.latency.record(model, "ttft", time.monotonic() - started)
+                                first_token = False
+                            yield chunk.choices[0].delta.content
+                finally:
+                    await response.close()
+            else:
+                async for chunk in response:
+                    content = chunk.choices[0].delta.get("content")
+                    if content:
+                        yield content
+            success = True
+        except GeneratorExit:
+            # Closed early by the consumer (e.g. at the closing code fence)
+            success = True
+            raise
+        finally:
+            self.limiter.release(success=success)
+
+    async def abatch(self, requests: List[Dict], poll_interval: float = LLM_BATCH_POLL_INTERVAL,
+                     timeout: Optional[float] = None) -> Dict[str, Optional[str]]:
+        """Run chat completions through the Batch API and return their content by custom_id
+
+        Each request is a dict with "custom_id", "model", "messages" and optionally
+        "temperature" and "max_tokens". Items that failed map to None. Endpoints
+        without the Batch API (such as many local stand-ins) get the requests sent
+        concurrently through the normal rate-limited path instead.
+        """
+        if not requests:
+            return {}
+        if not USE_NEW_OPENAI:
+            return await self._abatch_direct(requests)
+
+        lines = [
+            json.dumps({
+                "custom_id": item["custom_id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {key: item[key] for key in ("model", "messages", "temperature", "max_tokens") if key in item}
+            })
+            for item in requests
+        ]
+        try:
+            input_file = await self.async_client.files.create(
+                file=("batch_requests.jsonl", "\n".join(lines).encode("utf-8")),
+                purpose="batch"
+            )
+        except NotFoundError:
+            logger.info("Endpoint has no Batch API, sending batch requests directly")
+            return await self._abatch_direct(requests)
+
+        batch = await self.async_client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info(f"Submitted batch {batch.id} with {len(requests)} requests")
+        started = time.monotonic()
+        while batch.status not in BATCH_TERMINAL_STATES:
+            if timeout is not None and time.monotonic() - started > timeout:
+                await self.async_client.batches.cancel(batch.id)
+                raise TimeoutError(f"Batch {batch.id} did not finish within {timeout:.0f}s")
+            await asyncio.sleep(poll_interval)
+            batch = await self.async_client.batches.retrieve(batch.id)
+            counts = batch.request_counts
+            if counts is not None:
+                logger.info(f"Batch {batch.id} {batch.status}: {counts.completed}/{counts.total} done, {counts.failed} failed")
+
+        if batch.status != "completed":
+            logger.warning(f"Batch {batch.id} ended with status {batch.status}")
+        results: Dict[str, Optional[str]] = {item["custom_id"]: None for item in requests}
+        if batch.output_file_id:
+            output = await self.async_client.files.content(batch.output_file_id)
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get("response") or {}
+                if response.get("status_code") == 200:
+                    results[item["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        return results
+
+    async def _abatch_direct(self, requests: List[Dict]) -> Dict[str, Optional[str]]:
+        """Send batch items as ordinary concurrent completions"""
+        async def one(item):
+            try:
+                return await self.achat(
+                    item["messages"],
+                    model=item["model"],
+                    temperature=item.get("temperature", 0.2),
+                    max_tokens=item.get("max_tokens", 4000)
+                )
+            except Exception as e:
+                logger.error(f"Batch item {item['custom_id']} failed: {str(e)}")
+                return None
+
+        contents = await asyncio.gather(*(one(item) for item in requests))
+        return {item["custom_id"]: content for item, content in zip(requests, contents)}
+
+    async def atranscribe(self, audio_file, model: str = "whisper-1") -> str:
+        """Transcribe an open audio file with Whisper over the shared pool
+
+        Raises CircuitOpenError without calling Whisper while its breaker is open.
+        """
+        async def request():
+            if USE_NEW_OPENAI:
+                transcription = await self.async_client.audio.transcriptions.create(
+                    file=audio_file,
+                    model=model,
+                    **self._timeout_kwargs(call_timeout(LLM_READ_TIMEOUT))
+                )
+                return transcription.text
+            transcription = await self.client.Audio.atranscribe(model, audio_file)
+            return transcription["text"]
+
+        return await self.whisper_breaker.acall(request, is_failure=self._is_backend_failure)
+
+    def complete(self, system_prompt: str, user_prompt: str, model: str,
+                 temperature: float = 0.2, max_tokens: int = 4000,
+                 use_cache: bool = True, hedge: bool = False) -> str:
+        """Synchronous wrapper around acomplete()"""
+        return run_sync(self.acomplete(system_prompt, user_prompt, model, temperature, max_tokens, use_cache, hedge))
+
+    def chat(self, messages: List[Dict], model: str, temperature: float = 0.2,
+             max_tokens: int = 4000) -> str:
+        """Synchronous wrapper around achat()"""
+        return run_sync(self.achat(messages, model, temperature, max_tokens))
+
+    def stream(self, system_prompt: str, user_prompt: str, model: str,
+               temperature: float = 0.2, max_tokens: int = 4000, hedge: bool = False) -> Iterator[str]:
+        """Synchronous wrapper around astream(); closing it cancels the completion"""
+        deltas: "queue.Queue" = queue.Queue()
+
+        async def pump():
+            try:
+                async for delta in self.astream(system_prompt, user_prompt, model, temperature, max_tokens, hedge):
+                    deltas.put(delta)
+            except Exception as e:
+                deltas.put(e)
+            finally:
+                deltas.put(_STREAM_DONE)
+
+        future = runtime.submit(pump())
+        try:
+            while True:
+                item = deltas.get()
+                if item is _STREAM_DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def batch(self, requests: List[Dict], poll_interval: float = LLM_BATCH_POLL_INTERVAL,
+              timeout: Optional[float] = None) -> Dict[str, Optional[str]]:
+        """Synchronous wrapper around abatch()"""
+        return run_sync(self.abatch(requests, poll_interval, timeout))
+
+    def transcribe(self, audio_file, model: str = "whisper-1") -> str:
+        """Synchronous wrapper around atranscribe()"""
+        return run_sync(self.atranscribe(audio_file, model))
+
+    def warmup(self, connections: int = LLM_WARM_CONNECTIONS, background: bool = True):
+        """Pre-open pooled connections so the first requests skip TCP/TLS setup"""
+        if not USE_NEW_OPENAI or connections <= 0:
+            return
+        future = runtime.submit(self.awarmup(connections))
+        if not background:
+            future.result()
+
+    async def awarmup(self, connections: int = LLM_WARM_CONNECTIONS) -> int:
+        """Open connections in the running loop's pool and return how many succeeded"""
+        # Concurrent cheap requests force the pool to hold several live connections
+        results = await asyncio.gather(*[self._aping() for _ in range(connections)])
+        logger.info(f"Warmed {sum(results)}/{connections} LLM connections")
+        return sum(results)
+
+    async def _aping(self) -> bool:
+        """Make one lightweight authenticated request to open a connection"""
+        try:
+            await self.async_client.models.list()
+            return True
+        except Exception as e:
+            logger.warning(f"LLM connection warmup failed: {str(e)}")
+            return False
+
+    def hedge_stats(self) -> Dict:
+        """How often hedged duplicates were sent and how often they won"""
+        return dict(self._hedge_stats)
+
+    def close(self):
+        """Close the pooled clients and their connections"""
+        with self._client_lock:
+            if self._client is not None and USE_NEW_OPENAI:
+                self._client.close()
+            self._client = None
+        if runtime._loop is not None:
+            client = self._async_clients.pop(runtime._loop, None)
+            if client is not None:
+                runtime.submit(client.close()).result()
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """Return the process-wide gateway shared by every agent"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
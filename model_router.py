@@ -0,0 +1,111 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+from token_budget import context_window
+
+logger = logging.getLogger(__name__)
+
+# Models from fastest to strongest; stages start at the front and escalate on failure
+MODEL_TIERS = [m.strip() for m in os.getenv("MODEL_TIERS", "gpt-4.1-nano,gpt-4.1-mini,gpt-4.1").split(",") if m.strip()]
+# Inputs at least this large (in tokens) skip the fastest tier
+ROUTER_LARGE_INPUT_TOKENS = int(os.getenv("ROUTER_LARGE_INPUT_TOKENS", "6000"))
+# Headroom left in the context window for prompts and the completion
+ROUTER_CONTEXT_HEADROOM = 8192
+
+
+class Route(NamedTuple):
+    """One routing decision: which model a stage runs on and why"""
+    stage: str
+    model: str
+    tier: int
+    reason: str
+    started: float
+
+
+class ModelRouter:
+    """Tiered model routing: fastest model first, stronger models on failure or large input
+
+    Every decision and its outcome is recorded per (stage, model), so the
+    latency/success trade-off of each tier can be read from stats().
+    """
+
+    def __init__(self, tiers: Optional[List[str]] = None,
+                 large_input_tokens: int = ROUTER_LARGE_INPUT_TOKENS):
+        self.tiers = list(tiers or MODEL_TIERS)
+        if not self.tiers:
+            raise ValueError("ModelRouter needs at least one model tier")
+        self.large_input_tokens = large_input_tokens
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    @property
+    def signature(self) -> str:
+        """Stable identifier of the tier list, for cache keys"""
+        return ",".join(self.tiers)
+
+    def route(self, stage: str, input_tokens: int = 0, attempt: int = 0) -> Route:
+        """Pick the model for a stage's `attempt`-th try (0 = first try)"""
+        tier = attempt
+        reasons = [f"attempt {attempt}" if attempt else "first attempt"]
+        if input_tokens >= self.large_input_tokens:
+            tier += 1
+            reasons.append(f"large input ({input_tokens} tokens)")
+        # Never route to a model whose context the input can't fit in
+        while tier < len(self.tiers) - 1 and input_tokens + ROUTER_CONTEXT_HEADROOM > context_window(self.tiers[tier]):
+            tier += 1
+            reasons.append("context window")
+        tier = min(tier, len(self.tiers) - 1)
+
+        route = Route(stage, self.tiers[tier], tier, ", ".join(reasons), time.monotonic())
+        with self._lock:
+            entry = self._entry(stage, route.model)
+            entry["decisions"] += 1
+            if attempt:
+                entry["escalations"] += 1
+        logger.info(f"Routing {stage} to {route.model} ({route.reason})")
+        return route
+
+    def can_escalate(self, route: Route) -> bool:
+        return route.tier < len(self.tiers) - 1
+
+    def record(self, route: Route, success: bool, elapsed: Optional[float] = None):
+        """Record the outcome of a routed stage; elapsed defaults to time since the decision"""
+        if elapsed is None:
+            elapsed = time.monotonic() - route.started
+        with self._lock:
+            entry = self._entry(route.stage, route.model)
+            entry["successes" if success else "failures"] += 1
+            entry["seconds"] += elapsed
+
+    def _entry(self, stage: str, model: str) -> Dict[str, float]:
+        return self._stats.setdefault(stage, {}).setdefault(model, {
+            "decisions": 0, "escalations": 0, "successes": 0, "failures": 0, "seconds": 0.0
+        })
+
+    def stats(self) -> Dict:
+        """Per stage and model: decisions, escalations, success rate and mean latency"""
+        with self._lock:
+            snapshot = {stage: {model: dict(entry) for model, entry in models.items()}
+                        for stage, models in self._stats.items()}
+        for models in snapshot.values():
+            for entry in models.values():
+                outcomes = entry["successes"] + entry["failures"]
+                entry["success_rate"] = round(entry["successes"] / outcomes, 3) if outcomes else None
+                entry["mean_seconds"] = round(entry.pop("seconds") / outcomes, 3) if outcomes else None
+        return {"tiers": self.tiers, "stages": snapshot}
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """Return the process-wide model router, creating it on first use"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
@@ -0,0 +1,163 @@
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STARTED = "started"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+# Kinds of timing: a DAG stage, or a span inside a stage
+STAGE = "stage"
+SPAN = "span"
+
+
+class StageTiming(NamedTuple):
+    """When a stage (or a span inside one) ran, relative to the start of the run"""
+    name: str
+    kind: str
+    start: float
+    end: float
+    status: str
+    deps: Tuple[str, ...]
+
+
+class PipelineTrace:
+    """Per-stage timings of one pipeline run, and the critical path through them
+
+    `listener`, if given, is called with (name, kind, status) when a stage or
+    span starts and again when it ends, e.g. to report progress live.
+    """
+
+    def __init__(self, listener: Optional[Callable[[str, str, str], None]] = None):
+        self.started = time.monotonic()
+        self.timings: List[StageTiming] = []
+        self.listener = listener
+
+    def now(self) -> float:
+        return time.monotonic() - self.started
+
+    def start(self, name: str, kind: str) -> float:
+        """Note that a stage or span has started; returns its start time"""
+        if self.listener:
+            self.listener(name, kind, STARTED)
+        return self.now()
+
+    def record(self, name: str, kind: str, start: float, status: str, deps: Tuple[str, ...] = ()):
+        self.timings.append(StageTiming(name, kind, start, self.now(), status, deps))
+        if self.listener:
+            self.listener(name, kind, status)
+
+    @contextmanager
+    def span(self, name: str, kind: str = SPAN) -> Iterator[None]:
+        """Time a block, e.g. one execution attempt inside a stage"""
+        start = self.start(name, kind)
+        status = FAILED
+        try:
+            yield
+            status = DONE
+        except asyncio.CancelledError:
+            status = CANCELLED
+            raise
+        finally:
+            self.record(name, kind, start, status)
+
+    def critical_path(self) -> List[str]:
+        """Stages on the dependency chain that ends with the last stage to finish"""
+        stages = {timing.name: timing for timing in self.timings if timing.kind == STAGE and timing.status == DONE}
+        if not stages:
+            return []
+        path = []
+        current: Optional[StageTiming] = max(stages.values(), key=lambda timing: timing.end)
+        while current is not None:
+            path.append(current.name)
+            deps = [stages[dep] for dep in current.deps if dep in stages]
+            current = max(deps, key=lambda timing: timing.end) if deps else None
+        return list(reversed(path))
+
+    def summary(self) -> Dict:
+        """Wall-clock time against total stage time, the critical path and every timing
+
+        `work_seconds` adds up the stages; the further wall_seconds is below
+        it, the more of the work overlapped.
+        """
+        stages = {timing.name: timing for timing in self.timings if timing.kind == STAGE}
+        path = self.critical_path()
+        return {
+            "wall_seconds": round(self.now(), 3),
+            "work_seconds": round(sum(timing.end - timing.start for timing in self.timings
+                                      if timing.kind == STAGE), 3),
+            "critical_path": path,
+            "critical_path_seconds": round(sum(stages[name].end - stages[name].start for name in path), 3),
+            "stages": [
+                {
+                    "name": timing.name,
+                    "kind": timing.kind,
+                    "start": round(timing.start, 3),
+                    "end": round(timing.end, 3),
+                    "seconds": round(timing.end - timing.start, 3),
+                    "status": timing.status
+                }
+                for timing in sorted(self.timings, key=lambda timing: timing.start)
+            ]
+        }
+
+
+class StageGraph:
+    """A DAG of async stages with explicit dependencies
+
+    Each stage starts as soon as all of its dependencies have finished and is
+    called with their results as keyword arguments, so independent stages run
+    concurrently. If a stage fails, every stage still pending is cancelled and
+    the error is raised from run().
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+
+    def add(self, name: str, fn: Callable[..., Awaitable[Any]], *deps: str) -> "StageGraph":
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage {name!r} depends on unknown stage {dep!r}")
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage {name!r}")
+        self._stages[name] = (fn, deps)
+        return self
+
+    async def run(self, trace: Optional[PipelineTrace] = None) -> Dict[str, Any]:
+        """Run every stage and return their results by name"""
+        trace = trace or PipelineTrace()
+        tasks: Dict[str, asyncio.Future] = {}
+
+        async def run_stage(name: str):
+            fn, deps = self._stages[name]
+            results = await asyncio.gather(*(tasks[dep] for dep in deps))
+            start = trace.start(name, STAGE)
+            try:
+                result = await fn(**dict(zip(deps, results)))
+            except asyncio.CancelledError:
+                trace.record(name, STAGE, start, CANCELLED, deps)
+                raise
+            except BaseException:
+                trace.record(name, STAGE, start, FAILED, deps)
+                raise
+            trace.record(name, STAGE, start, DONE, deps)
+            return result
+
+        # Stages were added after their dependencies, so insertion order is a topological order
+        for name in self._stages:
+            tasks[name] = asyncio.ensure_future(run_stage(name))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return {name: task.result() for name, task in tasks.items()}
+
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Events kept per run for subscribers that connect late or fall behind
+PROGRESS_MAX_EVENTS = int(os.getenv("PROGRESS_MAX_EVENTS", "5000"))
+# How long a finished run's events stay available
+PROGRESS_RETENTION = float(os.getenv("PROGRESS_RETENTION", "300"))
+
+# (sequence number, event name, data)
+Event = Tuple[int, str, Dict[str, Any]]
+
+
+class ProgressChannel:
+    """Progress events of one pipeline run
+
+    emit() appends to a bounded buffer and never waits on subscribers, so a
+    slow or vanished client can't hold up the pipeline. Subscribers pull
+    from the buffer at their own pace with events().
+    """
+
+    def __init__(self, max_events: int = PROGRESS_MAX_EVENTS):
+        self._events: deque = deque(maxlen=max_events)
+        self._next_seq = 1
+        self._changed = threading.Condition()
+        self.closed_at: Optional[float] = None
+
+    @property
+    def closed(self) -> bool:
+        return self.closed_at is not None
+
+    def emit(self, event: str, **data: Any):
+        with self._changed:
+            if self.closed:
+                return
+            self._events.append((self._next_seq, event, data))
+            self._next_seq += 1
+            self._changed.notify_all()
+
+    def close(self):
+        """Mark the run finished; subscribers stop once they have read everything"""
+        with self._changed:
+            if not self.closed:
+                self.closed_at = time.monotonic()
+            self._changed.notify_all()
+
+    def events(self, after: int = 0, heartbeat: float = 15.0) -> Iterator[Optional[Event]]:
+        """Yield events with a sequence number above `after` until the run closes
+
+        Yields None after `heartbeat` seconds without an event, so the caller
+        can write a keep-alive and notice a disconnected client. A subscriber
+        that falls further behind than the buffer skips the dropped events.
+        """
+        while True:
+            with self._changed:
+                pending = [event for event in self._events if event[0] > after]
+                if not pending and not self.closed:
+                    self._changed.wait(heartbeat)
+                    pending = [event for event in self._events if event[0] > after]
+                closed = self.closed
+            if pending:
+                for event in pending:
+                    yield event
+                after = pending[-1][0]
+            elif closed:
+                return
+            else:
+                yield None
+
+
+class ProgressHub:
+    """Progress channels by run ID (job ID), dropped a while after their run closes"""
+
+    def __init__(self, retention: float = PROGRESS_RETENTION):
+        self.retention = retention
+        self._channels: Dict[str, ProgressChannel] = {}
+        self._lock = threading.Lock()
+
+    def open(self, run_id: str) -> ProgressChannel:
+        """The run's channel, created if it doesn't exist yet"""
+        with self._lock:
+            self._prune()
+            channel = self._channels.get(run_id)
+            if channel is None:
+                channel = self._channels[run_id] = ProgressChannel()
+            return channel
+
+    def get(self, run_id: str) -> Optional[ProgressChannel]:
+        with self._lock:
+            return self._channels.get(run_id)
+
+    def _prune(self):
+        # Called with the lock held
+        now = time.monotonic()
+        expired = [run_id for run_id, channel in self._channels.items()
+                   if channel.closed and now - channel.closed_at > self.retention]
+        for run_id in expired:
+            del self._channels[run_id]
+
+
+def format_sse(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """One Server-Sent Events message"""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in json.dumps(data).splitlines())
+    return "\n".join(lines) + "\n\n"
+
+
+# Channel of the run being processed; asyncio tasks inherit it from their parent
+_current_channel: ContextVar[Optional[ProgressChannel]] = ContextVar("progress", default=None)
+
+
+def emit(event: str, **data: Any):
+    """Report progress on the current run's channel, if it has one"""
+    channel = _current_channel.get()
+    if channel is not None:
+        channel.emit(event, **data)
+
+
+@contextmanager
+def progress_scope(channel: Optional[ProgressChannel]) -> Iterator[Optional[ProgressChannel]]:
+    """Send the progress of a block to a channel"""
+    if channel is None:
+        yield _current_channel.get()
+        return
+    token = _current_channel.set(channel)
+    try:
+        yield channel
+    finally:
+        _current_channel.reset(token)
+
+
+@contextmanager
+def silenced() -> Iterator[None]:
+    """Report nothing from a block, e.g. from work running beside the one being shown"""
+    token = _current_channel.set(None)
+    try:
+        yield
+    finally:
+        _current_channel.reset(token)
@@ -0,0 +1,180 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Client-side limits, overridable through the environment
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_INITIAL_CONCURRENCY = float(os.getenv("LLM_INITIAL_CONCURRENCY", "8"))
+LLM_MIN_CONCURRENCY = float(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = float(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+
+# How often waiters re-check for a free concurrency slot
+_POLL_INTERVAL = 0.05
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate
+
+    State is guarded by a thread lock and waiting uses asyncio.sleep, so one
+    bucket can be shared by coroutines running on different event loops.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float) -> float:
+        """Take tokens if available; otherwise return the seconds to wait"""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    async def acquire(self, amount: float = 1) -> float:
+        """Wait until the tokens are available and take them; returns seconds waited"""
+        waited = 0.0
+        while True:
+            delay = self.try_acquire(amount)
+            if delay <= 0:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def refund(self, amount: float):
+        """Return unused tokens, e.g. when a completion was shorter than reserved"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + max(0.0, amount))
+
+
+class AdaptiveConcurrency:
+    """AIMD concurrency window: +1 per window of successes, halved on each 429"""
+
+    def __init__(self, initial: float = LLM_INITIAL_CONCURRENCY, minimum: float = LLM_MIN_CONCURRENCY,
+                 maximum: float = LLM_MAX_CONCURRENCY):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = max(minimum, min(initial, maximum))
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> float:
+        """Wait for a free slot in the window; returns seconds waited"""
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                if self.in_flight < int(self.window):
+                    self.in_flight += 1
+                    return time.monotonic() - started
+            await asyncio.sleep(_POLL_INTERVAL)
+
+    def release(self):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def on_success(self):
+        with self._lock:
+            self.window = min(self.maximum, self.window + 1.0 / self.window)
+
+    def on_throttled(self):
+        with self._lock:
+            self.window = max(self.minimum, self.window / 2)
+            logger.warning(f"Rate limited: concurrency window reduced to {self.window:.1f}")
+
+
+class RateLimiter:
+    """Shared client-side limiter for OpenAI calls: RPM and TPM buckets plus an AIMD window"""
+
+    def __init__(self, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+                 concurrency: Optional[AdaptiveConcurrency] = None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "throttled": 0, "queued_seconds": 0.0}
+
+    async def acquire(self, estimated_tokens: int):
+        """Wait for a request slot and token budget before sending a request"""
+        waited = 0.0
+        # Honour a server-requested pause (Retry-After) for every caller
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+            waited += pause
+        waited += await self.concurrency.acquire()
+        try:
+            waited += await self.requests.acquire(1)
+            waited += await self.tokens.acquire(estimated_tokens)
+        except BaseException:
+            self.concurrency.release()
+            raise
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["queued_seconds"] += waited
+        if waited > 1:
+            logger.info(f"Queued {waited:.1f}s for LLM rate limits")
+
+    def release(self, success: bool, unused_tokens: int = 0):
+        """Release the request slot, feeding the outcome back into the window"""
+        self.concurrency.release()
+        if success:
+            self.concurrency.on_success()
+        if unused_tokens > 0:
+            self.tokens.refund(unused_tokens)
+
+    def on_rate_limited(self, retry_after: Optional[float]):
+        """Shrink the window and pause all callers for the server's Retry-After"""
+        self.concurrency.on_throttled()
+        with self._lock:
+            self._stats["throttled"] += 1
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued_seconds"] = round(stats["queued_seconds"], 2)
+        stats["concurrency_window"] = round(self.concurrency.window, 2)
+        stats["in_flight"] = self.concurrency.in_flight
+        return stats
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read Retry-After (or retry-after-ms) from an API error's response headers"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,233 @@
+import os
+import json
+import contextlib
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cache settings, overridable through the environment
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", ".cache/llm_responses"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "512"))
+LLM_CACHE_DISK_BYTES = int(os.getenv("LLM_CACHE_DISK_MB", "200")) * 1024 * 1024
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+
+_MISSING = object()
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Build a content-addressed key from JSON-serializable parts"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryLRU:
+    """Bounded in-process LRU map with per-entry expiry"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        created, value = entry
+        if time.time() - created > self.ttl:
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, created: Optional[float] = None) -> int:
+        """Store a value and return how many entries were evicted"""
+        self._entries[key] = (created or time.time(), value)
+        self._entries.move_to_end(key)
+        evicted = 0
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskStore:
+    """On-disk JSON store with TTL and size-based eviction of least recently used files"""
+
+    def __init__(self, directory: Path, max_bytes: int, ttl: float):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._total_bytes = sum(path.stat().st_size for path in self._files())
+
+    def _files(self):
+        return self.directory.glob("*/*.json")
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> tuple:
+        """Return (created, value), or (None, _MISSING) when absent or expired"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None, _MISSING
+        if time.time() - entry["created"] > self.ttl:
+            self._remove(path)
+            return None, _MISSING
+        # Touch the file so eviction treats it as recently used
+        os.utime(path, None)
+        return entry["created"], entry["value"]
+
+    def set(self, key: str, value: Any, created: float) -> int:
+        """Store a value atomically and return how many files were evicted"""
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        previous = path.stat().st_size if path.exists() else 0
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"created": created, "value": value}, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except BaseException:
+            # An unserializable value or a full disk must not leave an untracked temp file behind
+            with contextlib.suppress(OSError):
+                os.unlink(temp_path)
+            raise
+        self._total_bytes += path.stat().st_size - previous
+        return self._evict() if self._total_bytes > self.max_bytes else 0
+
+    def delete(self, key: str):
+        self._remove(self._path(key))
+
+    def _remove(self, path: Path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+            self._total_bytes -= size
+        except OSError:
+            pass
+
+    def _evict(self) -> int:
+        """Drop expired and then least recently used files until under 90% of the budget"""
+        target = self.max_bytes * 0.9
+        now = time.time()
+        files = []
+        for path in self._files():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        evicted = 0
+        for mtime, size, path in files:
+            if self._total_bytes <= target and now - mtime <= self.ttl:
+                break
+            self._remove(path)
+            evicted += 1
+        return evicted
+
+    def clear(self):
+        for path in list(self._files()):
+            self._remove(path)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + disk) content-addressed cache with hit/miss stats"""
+
+    def __init__(self, name: str = "llm", directory: Path = LLM_CACHE_DIR,
+                 max_entries: int = LLM_CACHE_MEMORY_ENTRIES,
+                 max_disk_bytes: int = LLM_CACHE_DISK_BYTES,
+                 ttl: float = LLM_CACHE_TTL, enabled: bool = LLM_CACHE_ENABLED):
+        self.name = name
+        self.enabled = enabled
+        self.ttl = ttl
+        self.memory = MemoryLRU(max_entries, ttl)
+        self.disk = None
+        if enabled and max_disk_bytes > 0:
+            try:
+                self.disk = DiskStore(directory, max_disk_bytes, ttl)
+            except OSError as e:
+                logger.warning(f"Disk tier for {name} cache unavailable: {str(e)}")
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Look a key up in memory, then on disk (promoting disk hits to memory)"""
+        if not self.enabled:
+            return default
+        with self._lock:
+            value = self.memory.get(key)
+            if value is not _MISSING:
+                self._stats["memory_hits"] += 1
+                return value
+            if self.disk is not None:
+                created, value = self.disk.get(key)
+                if value is not _MISSING:
+                    self._stats["disk_hits"] += 1
+                    self._stats["evictions"] += self.memory.set(key, value, created)
+                    return value
+            self._stats["misses"] += 1
+            return default
+
+    def set(self, key: str, value: Any):
+        """Store a JSON-serializable value in both tiers"""
+        if not self.enabled:
+            return
+        created = time.time()
+        with self._lock:
+            self._stats["sets"] += 1
+            self._stats["evictions"] += self.memory.set(key, value, created)
+            if self.disk is not None:
+                try:
+                    self._stats["evictions"] += self.disk.set(key, value, created)
+                except (OSError, TypeError) as e:
+                    logger.warning(f"Could not write {self.name} cache entry to disk: {str(e)}")
+
+    def delete(self, key: str):
+        with self._lock:
+            self.memory.delete(key)
+            if self.disk is not None:
+                self.disk.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+            if self.disk is not None:
+                self.disk.clear()
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current tier sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+            stats["memory_entries"] = len(self.memory)
+            stats["disk_bytes"] = self.disk.total_bytes if self.disk is not None else 0
+            stats["enabled"] = self.enabled
+            return stats
@@ -1,30 +1,39 @@
 import os
 import time
+import codecs
+import asyncio
 import re
 import sys
+import shutil
 import subprocess
 import tempfile
+import threading
 from pathlib import Path
 import logging
 import json
-from typing import Dict, List, Optional, Union, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Union, Tuple
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Try to import OpenAI with new client format first
-try:
-    from openai import OpenAI
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    USE_NEW_OPENAI = True
-    logger.info("Using new OpenAI client")
-except ImportError:
-    # Fall back to old format
-    import openai
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    USE_NEW_OPENAI = False
-    logger.info("Using legacy OpenAI package")
+# All LLM traffic goes through the shared, connection-pooled gateway
+from llm_gateway import LLM_BATCH_POLL_INTERVAL, LLMGateway, get_gateway, run_sync, USE_NEW_OPENAI
+from response_cache import ResponseCache, make_cache_key
+from singleflight import SingleFlight
+from token_budget import count_tokens, rewrite_budget, truncate_to_tokens
+from code_patch import DIVIDER_MARKER, REPLACE_MARKER, SEARCH_MARKER, PatchError, apply_edits, parse_edits
+from code_context import extract_traceback, relevant_line_ranges, render_excerpts, script_frames
+from model_router import ModelRouter, Route, get_router
+from circuit_breaker import CircuitOpenError, breaker_stats, get_breaker
+from pipeline_dag import PipelineTrace, StageGraph
+from job_queue import FINISHED, JobQueue, QueueFull
+from progress import ProgressChannel, ProgressHub, emit, format_sse, progress_scope, silenced
+from static_check import format_report, repair, validate
+from explanations import ExplanationStore
+from error_signature import RepairTracker
+from fast_path import FAST_PATH, Catalog, CatalogEntry
+from deadline import PIPELINE_DEADLINE, DeadlineExceeded, call_timeout, current_deadline, deadline_scope
 
 # Try to import speech recognition
 try:
@@ -35,8 +44,22 @@ except ImportError:
     SPEECH_RECOGNITION_AVAILABLE = False
     logger.info("Speech recognition not available")
 
+# Google speech is skipped while it keeps failing, like the OpenAI backends
+google_speech_breaker = get_breaker("google_speech")
+
+
+def recognize_google(recognizer, audio_data) -> str:
+    """Transcribe with Google speech through its circuit breaker
+    
+    Unintelligible audio is not held against the backend; only request errors are.
+    """
+    return google_speech_breaker.call(
+        recognizer.recognize_google, audio_data,
+        is_failure=lambda error: isinstance(error, sr.RequestError)
+    )
+
 # For web interface
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory
 
 # Path to save generated code
 GENERATED_CODE_DIR = Path("generated_code")
@@ -45,19 +68,207 @@ GENERATED_CODE_DIR.mkdir(exist_ok=True)
 # Initialize Flask app
 app = Flask(__name__)
 
+# Finished pipeline results, keyed on the normalized transcript
+PIPELINE_CACHE_DIR = Path(os.getenv("PIPELINE_CACHE_DIR", ".cache/pipeline_results"))
+pipeline_cache = ResponseCache("pipeline", directory=PIPELINE_CACHE_DIR)
+
+# Words that carry no intent in spoken requests
+FILLER_WORDS = {
+    'um', 'umm', 'uh', 'uhh', 'er', 'erm', 'ah', 'hmm', 'like', 'please', 'just',
+    'okay', 'ok', 'so', 'well', 'hey', 'actually', 'basically', 'kindly'
+}
+
+# Input limits applied before any LLM call (in tokens)
+MAX_CODE_TOKENS = int(os.getenv("MAX_CODE_TOKENS", "24000"))
+DEBUG_ERROR_TOKEN_LIMIT = int(os.getenv("DEBUG_ERROR_TOKEN_LIMIT", "1500"))
+EXPLAIN_CODE_TOKEN_LIMIT = int(os.getenv("EXPLAIN_CODE_TOKEN_LIMIT", "12000"))
+
+# Files at least this long are debugged from the traceback's excerpts rather than in full
+DEBUG_LOCALIZE_MIN_LINES = int(os.getenv("DEBUG_LOCALIZE_MIN_LINES", "60"))
+
+# "diff" asks the enhancer for SEARCH/REPLACE edits instead of the whole file
+ENHANCER_MODE = os.getenv("ENHANCER_MODE", "diff").lower()
+
+# Stream generator completions and stop reading at the closing code fence
+GENERATOR_STREAMING = os.getenv("GENERATOR_STREAMING", "true").lower() in ("1", "true", "yes")
+
+# Send a duplicate generator request when the first is slower than its p95
+GENERATOR_HEDGING = os.getenv("GENERATOR_HEDGING", "false").lower() in ("1", "true", "yes")
+
+# Execute generated code straight away and call the debugger only if it fails,
+# instead of sending every program through a preventive debugging pass first
+EXECUTE_FIRST = os.getenv("EXECUTE_FIRST", "false").lower() in ("1", "true", "yes")
+
+# Debug-and-rerun attempts after a failed execution, each on a stronger model tier;
+# the loop stops early once an error repeats (see ERROR_SIGNATURE_HISTORY)
+MAX_REPAIR_ATTEMPTS = int(os.getenv("MAX_REPAIR_ATTEMPTS", "2"))
+
+# Programs generated (and fixes requested per repair round) side by side at spread
+# temperatures, all executed at once with the first to pass kept; 1 runs serially
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "1"))
+
+# When explanations are computed; responses never wait for them either way:
+#   speculative - on each candidate while it executes
+#   background  - once the final code is known
+#   on-demand   - on the first GET /api/explanations/<id>
+EXPLAIN_MODE = os.getenv("EXPLAIN_MODE", "speculative").lower()
+
+# Longest a GET /api/jobs/<id>?wait=N long-poll is held, and the Retry-After sent when the queue is full
+JOB_MAX_WAIT = 30
+JOB_RETRY_AFTER = 5
+# Seconds between keep-alives on an idle progress stream
+SSE_HEARTBEAT = 15
+
+# Bulk mode: how many generated programs are executed locally at once
+BULK_EXECUTION_WORKERS = int(os.getenv("BULK_EXECUTION_WORKERS", "4"))
+
+
+class CodeFenceParser:
+    """Incrementally extracts the Python code block from streamed model output
+    
+    A block fenced as ```python (or ```py) wins; until one closes, other
+    blocks are skipped and the first of them is kept as the fallback, so a
+    `pip install` snippet ahead of the program is never mistaken for it.
+    Code of python and untagged blocks is reported as it arrives.
+    """
+    
+    FENCE = "```"
+    PYTHON_TAGS = ("python", "py", "python3")
+    
+    def __init__(self):
+        self.state = "prose"  # prose -> header -> code -> closed, or back to prose after a non-python block
+        self._raw: List[str] = []
+        self._code: List[str] = []
+        self._buffer = ""
+        self._tag = ""
+        self._first_block: Optional[str] = None
+    
+    @property
+    def closed(self) -> bool:
+        """Whether the closing fence of a python block has been seen"""
+        return self.state == "closed"
+    
+    @property
+    def partial_code(self) -> str:
+        """Code of the current block extracted so far"""
+        return "".join(self._code)
+    
+    @property
+    def _is_python(self) -> bool:
+        return self._tag in self.PYTHON_TAGS
+    
+    def feed(self, chunk: str) -> str:
+        """Consume a chunk of model output and return any newly available code"""
+        self._raw.append(chunk)
+        if self.state == "closed":
+            return ""
+        self._buffer += chunk
+        new_code = ""
+        
+        while True:
+            if self.state == "prose":
+                idx = self._buffer.find(self.FENCE)
+                if idx == -1:
+                    # Keep trailing backticks in case they start a fence split across chunks
+                    self._buffer = self._buffer[-(len(self.FENCE) - 1):]
+                    break
+                self._buffer = self._buffer[idx + len(self.FENCE):]
+                self.state = "header"
+            
+            if self.state == "header":
+                # The opening fence line holds the language tag
+                newline = self._buffer.find("\n")
+                if newline == -1:
+                    break
+                info = self._buffer[:newline].split()
+                self._tag = info[0].lower() if info else ""
+                self._buffer = self._buffer[newline + 1:]
+                self._code = []
+                self.state = "code"
+            
+            if self.state == "code":
+                idx = self._buffer.find(self.FENCE)
+                if idx == -1:
+                    # Hold back trailing backticks that may be the start of the closing fence
+                    held = len(self._buffer) - len(self._buffer.rstrip("`"))
+                    block_code = self._buffer[:len(self._buffer) - held]
+                    self._buffer = self._buffer[len(block_code):]
+                else:
+                    block_code = self._buffer[:idx]
+                    self._buffer = self._buffer[idx + len(self.FENCE):]
+                self._code.append(block_code)
+                if self._is_python or not self._tag:
+                    new_code += block_code
+                if idx == -1:
+                    break
+                if self._is_python:
+                    self._buffer = ""
+                    self.state = "closed"
+                    break
+                # A python block may still follow; keep this one in case none does
+                if self._first_block is None:
+                    self._first_block = self.partial_code
+                self.state = "prose"
+        
+        return new_code
+    
+    def finish(self) -> str:
+        """Return the final code once the stream has ended"""
+        if self.state == "closed":
+            return self.partial_code.strip()
+        if self.state == "code" and (self._is_python or self._first_block is None):
+            # Unterminated fence: everything after the opening line is code
+            return (self.partial_code + self._buffer).strip()
+        if self._first_block is not None:
+            # No python block: fall back to the first block
+            return self._first_block.strip()
+        # No fence at all: treat the whole response as code
+        return "".join(self._raw).strip()
+
+
+def normalize_transcript(text: str) -> str:
+    """Normalize a spoken request so trivially different transcripts share a cache key"""
+    text = text.lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    words = [word for word in text.split() if word not in FILLER_WORDS]
+    return " ".join(words)
+
+
+def compiles(code: str) -> bool:
+    """True if the code is non-empty and valid Python syntax"""
+    if not code.strip():
+        return False
+    try:
+        compile(code, "<generated>", "exec")
+        return True
+    except (SyntaxError, ValueError):
+        return False
+
+
+def candidate_temperatures(count: int, low: float = 0.2, high: float = 1.0) -> List[float]:
+    """`count` sampling temperatures spread evenly from low to high"""
+    if count <= 1:
+        return [low]
+    step = (high - low) / (count - 1)
+    return [round(low + index * step, 2) for index in range(count)]
+
+
+def extract_code_block(text: str) -> str:
+    """Extract code from potential markdown format"""
+    parser = CodeFenceParser()
+    parser.feed(text)
+    return parser.finish()
+
+
+class CodeGenerationError(RuntimeError):
+    """Raised when no code could be generated, so there is nothing to debug or run"""
+
+
 class CodeGeneratorAgent:
     """Agent responsible for generating code based on natural language descriptions"""
     
-    def __init__(self, model="gpt-4.1-nano"):
-        self.model = model
-        logger.info(f"Initialized CodeGeneratorAgent with model: {model}")
-    
-    def generate(self, description: str) -> str:
-        """Generate code based on description"""
-        logger.info(f"Generating code for: {description}")
-        
-        # System prompt designed for high-quality code generation
-        system_prompt = """You are an expert Python programming agent specialized in generating production-quality code. 
+    # System prompt designed for high-quality code generation
+    system_prompt = """You are an expert Python programming agent specialized in generating production-quality code. 
 Your code should be:
 1. Well-structured and organized
 2. Thoroughly commented
@@ -68,68 +279,106 @@ Your code should be:
 
 If you generate code that requires external libraries, include code to check if they're installed and provide 
 instructions on how to install them if they're not."""
-        
-        user_prompt = f"""Generate Python code for: {description}
+    
+    def __init__(self, model="gpt-4.1-nano", gateway: Optional[LLMGateway] = None,
+                 stream: bool = GENERATOR_STREAMING, hedge: bool = GENERATOR_HEDGING):
+        self.model = model
+        self.gateway = gateway or get_gateway()
+        self.stream = stream
+        self.hedge = hedge
+        logger.info(f"Initialized CodeGeneratorAgent with model: {model}")
+    
+    @staticmethod
+    def user_prompt(description: str) -> str:
+        """User prompt asking for code that implements the description"""
+        return f"""Generate Python code for: {description}
         
 Make sure the code is complete, executable, and robust. Include proper error handling and all necessary imports.
 If the code requires external libraries, add code that checks if they're installed and provides instructions to install them.
 
 Return ONLY the full Python code with no additional explanations."""
+    
+    def generate(self, description: str, stream: Optional[bool] = None,
+                 on_code: Optional[Callable[[str], None]] = None, model: Optional[str] = None,
+                 temperature: float = 0.2) -> str:
+        """Generate code based on description"""
+        return run_sync(self.agenerate(description, stream=stream, on_code=on_code, model=model,
+                                       temperature=temperature))
+    
+    async def agenerate(self, description: str, stream: Optional[bool] = None,
+                        on_code: Optional[Callable[[str], None]] = None,
+                        model: Optional[str] = None, temperature: float = 0.2) -> str:
+        """Generate code based on description
+        
+        In streaming mode each new fragment of code is passed to `on_code` as it
+        arrives, and the completion is cancelled as soon as the code block closes.
+        `model` overrides the agent's default model for this call.
+        """
+        logger.info(f"Generating code for: {description}")
+        if stream is None:
+            stream = self.stream
+        model = model or self.model
+        
+        system_prompt = self.system_prompt
+        user_prompt = self.user_prompt(description)
         
         try:
-            if USE_NEW_OPENAI:
-                response = client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=0.2,
-                    max_tokens=4000
-                )
-                code = response.choices[0].message.content
+            if stream:
+                code = await self._agenerate_streaming(system_prompt, user_prompt, model, on_code, temperature)
             else:
-                response = openai.ChatCompletion.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=0.2,
-                    max_tokens=4000
+                # Fresh generations are wanted here, so skip the response cache
+                code = await self.gateway.acomplete(
+                    system_prompt=system_prompt,
+                    user_prompt=user_prompt,
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=4000,
+                    use_cache=False,
+                    hedge=self.hedge
                 )
-                code = response.choices[0].message.content
-            
-            # Extract code from potential markdown format
-            if "```python" in code and "```" in code.split("```python", 1)[1]:
-                code = code.split("```python", 1)[1].split("```", 1)[0].strip()
-            elif "```" in code:
-                code = code.split("```", 1)[1].split("```", 1)[0].strip()
+                
+                # Extract code from potential markdown format
+                code = extract_code_block(code)
             
             logger.info(f"Successfully generated code ({len(code)} characters)")
             return code
         
         except Exception as e:
             logger.error(f"Error generating code: {str(e)}")
-            return f"# Error generating code: {str(e)}"
+            raise CodeGenerationError(f"Error generating code: {str(e)}") from e
+    
+    async def _agenerate_streaming(self, system_prompt: str, user_prompt: str, model: str,
+                                   on_code: Optional[Callable[[str], None]] = None,
+                                   temperature: float = 0.2) -> str:
+        """Stream the completion, extracting the code block as it arrives"""
+        parser = CodeFenceParser()
+        deltas = self.gateway.astream(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            model=model,
+            temperature=temperature,
+            max_tokens=4000,
+            hedge=self.hedge
+        )
+        try:
+            async for delta in deltas:
+                code_delta = parser.feed(delta)
+                if code_delta and on_code:
+                    on_code(code_delta)
+                if parser.closed:
+                    # Anything after the closing fence is prose we don't need
+                    logger.info("Closing code fence received, cancelling the rest of the stream")
+                    break
+        finally:
+            await deltas.aclose()
+        return parser.finish()
 
 
 class CodeDebuggerAgent:
     """Agent responsible for debugging and fixing code"""
     
-    def __init__(self, model="gpt-4.1-nano"):
-        self.model = model
-        logger.info(f"Initialized CodeDebuggerAgent with model: {model}")
-    
-    def debug(self, code: str, error_message: str = None) -> str:
-        """Debug code by fixing potential errors"""
-        if error_message:
-            logger.info(f"Debugging code with error: {error_message[:100]}...")
-        else:
-            logger.info("Doing preventive debugging of code")
-        
-        # System prompt designed for debugging
-        system_prompt = """You are an expert Python debugging agent specialized in finding and fixing errors in code.
+    # System prompt designed for debugging
+    system_prompt = """You are an expert Python debugging agent specialized in finding and fixing errors in code.
 Focus on:
 1. Syntax errors
 2. Runtime errors
@@ -139,9 +388,25 @@ Focus on:
 
 Fix the code comprehensively. Don't just address the immediate error; look for other potential issues 
 that might arise after the first one is fixed."""
-        
+    
+    def __init__(self, model="gpt-4.1-nano", gateway: Optional[LLMGateway] = None,
+                 localize_min_lines: int = DEBUG_LOCALIZE_MIN_LINES):
+        self.model = model
+        self.gateway = gateway or get_gateway()
+        self.localize_min_lines = localize_min_lines
+        logger.info(f"Initialized CodeDebuggerAgent with model: {model}")
+    
+    @staticmethod
+    def trim_error(error_message: str, model: str) -> str:
+        """Keep only the tail of the traceback; earlier output is mostly pip chatter"""
+        error_message = extract_traceback(error_message)
+        return truncate_to_tokens(error_message, DEBUG_ERROR_TOKEN_LIMIT, model, keep="tail")
+    
+    @staticmethod
+    def rewrite_prompt(code: str, error_message: Optional[str] = None) -> str:
+        """User prompt asking for the whole file back, fixed for the (trimmed) error if given"""
         if error_message:
-            user_prompt = f"""Debug this Python code that has the following error:
+            return f"""Debug this Python code that has the following error:
 ERROR:
 {error_message}
 
@@ -152,42 +417,54 @@ CODE:
 
 Return ONLY the complete fixed code with no explanations."""
         else:
-            user_prompt = f"""Analyze this Python code for potential errors or improvements:
+            return f"""Analyze this Python code for potential errors or improvements:
 ```python
 {code}
 ```
 
 Return ONLY the complete improved code with no explanations."""
+    
+    def debug(self, code: str, error_message: str = None, model: Optional[str] = None,
+              temperature: float = 0.2) -> str:
+        """Debug code by fixing potential errors"""
+        return run_sync(self.adebug(code, error_message, model, temperature))
+    
+    async def adebug(self, code: str, error_message: str = None, model: Optional[str] = None,
+                     temperature: float = 0.2) -> str:
+        """Debug code by fixing potential errors (`model` overrides the default for this call)"""
+        model = model or self.model
+        if error_message:
+            logger.info(f"Debugging code with error: {error_message[:100]}...")
+        else:
+            logger.info("Doing preventive debugging of code")
+        
+        # Size the rewrite from the input and refuse files too large to return whole
+        code_tokens = count_tokens(code, model)
+        if code_tokens > MAX_CODE_TOKENS:
+            logger.warning(f"Skipping debugging: code is {code_tokens} tokens (limit {MAX_CODE_TOKENS})")
+            return code
+        if error_message:
+            error_message = self.trim_error(error_message, model)
+            
+            if len(code.splitlines()) >= self.localize_min_lines:
+                fixed_code = await self._adebug_localized(code, error_message, model, temperature)
+                if fixed_code is not None:
+                    return fixed_code
+        
+        system_prompt = self.system_prompt
+        user_prompt = self.rewrite_prompt(code, error_message)
         
         try:
-            if USE_NEW_OPENAI:
-                response = client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=0.2,
-                    max_tokens=4000
-                )
-                fixed_code = response.choices[0].message.content
-            else:
-                response = openai.ChatCompletion.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=0.2,
-                    max_tokens=4000
-                )
-                fixed_code = response.choices[0].message.content
+            fixed_code = await self.gateway.acomplete(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                model=model,
+                temperature=temperature,
+                max_tokens=rewrite_budget(code_tokens)
+            )
             
             # Extract code from potential markdown format
-            if "```python" in fixed_code and "```" in fixed_code.split("```python", 1)[1]:
-                fixed_code = fixed_code.split("```python", 1)[1].split("```", 1)[0].strip()
-            elif "```" in fixed_code:
-                fixed_code = fixed_code.split("```", 1)[1].split("```", 1)[0].strip()
+            fixed_code = extract_code_block(fixed_code)
             
             logger.info("Successfully debugged code")
             return fixed_code
@@ -195,14 +472,116 @@ Return ONLY the complete improved code with no explanations."""
         except Exception as e:
             logger.error(f"Error debugging code: {str(e)}")
             return code  # Return original code if debugging fails
+    
+    async def _adebug_localized(self, code: str, traceback_text: str, model: str,
+                                temperature: float = 0.2) -> Optional[str]:
+        """Fix an error from the excerpts its traceback points at; returns None if that fails"""
+        failing_lines = [frame.lineno for frame in script_frames(traceback_text)]
+        ranges = relevant_line_ranges(code, failing_lines)
+        if not ranges:
+            return None
+        excerpts = render_excerpts(code, ranges)
+        logger.info(f"Debugging from {len(ranges)} excerpt(s) around lines {failing_lines}")
+        
+        user_prompt = f"""Debug this Python program. It fails with the following error:
+ERROR:
+{traceback_text}
+
+Only the parts of the file involved in the failure are shown, each labelled with its line range in the full file:
+
+{excerpts}
+
+Describe the fix as one or more SEARCH/REPLACE blocks in exactly this format:
+
+{SEARCH_MARKER}
+lines copied exactly from the excerpts above
+{DIVIDER_MARKER}
+the lines that replace them
+{REPLACE_MARKER}
+
+Each SEARCH section must match the code exactly, including indentation, and must be unique in the file.
+Return ONLY the blocks with no explanations."""
+        
+        try:
+            response = await self.gateway.acomplete(
+                system_prompt=self.system_prompt,
+                user_prompt=user_prompt,
+                model=model,
+                temperature=temperature,
+                max_tokens=rewrite_budget(count_tokens(excerpts, model))
+            )
+            fixed_code = apply_edits(code, parse_edits(response))
+            compile(fixed_code, "<debugged>", "exec")
+        except (PatchError, SyntaxError) as e:
+            logger.warning(f"Could not apply localized fix: {str(e)}")
+            return None
+        except Exception as e:
+            logger.error(f"Error requesting localized fix: {str(e)}")
+            return None
+        
+        logger.info("Successfully debugged code from traceback excerpts")
+        return fixed_code
 
 
 class CodeExecutorAgent:
-    """Agent responsible for running code and handling dependencies"""
+    """Agent responsible for running code and handling dependencies
+    
+    One executor is shared by all requests: the installed-package set is
+    guarded by a lock, and pip installs are serialized so concurrent requests
+    never install the same package twice.
+    """
+    
+    # Map import names to PyPI names; these are installed on demand before execution
+    package_mapping = {
+        'pygame': 'pygame',
+        'numpy': 'numpy',
+        'np': 'numpy',
+        'pd': 'pandas',
+        'pandas': 'pandas',
+        'sklearn': 'scikit-learn',
+        'matplotlib': 'matplotlib',
+        'plt': 'matplotlib',
+        'bs4': 'beautifulsoup4',
+        'PIL': 'pillow',
+        'cv2': 'opencv-python',
+        'tk': 'tk',
+        'tkinter': 'tk',
+        'requests': 'requests',
+        'flask': 'flask',
+        'django': 'django',
+        'tf': 'tensorflow',
+        'tensorflow': 'tensorflow',
+        'torch': 'torch',
+        'seaborn': 'seaborn',
+        'sns': 'seaborn'
+    }
     
     def __init__(self):
         logger.info("Initialized CodeExecutorAgent")
-        self.installed_packages = self._get_installed_packages()
+        self._packages_lock = threading.Lock()
+        self._install_lock = threading.Lock()
+        self._installed: Set[str] = set(self._get_installed_packages())
+    
+    @property
+    def installed_packages(self) -> List[str]:
+        """Snapshot of the installed package names (lowercase)"""
+        with self._packages_lock:
+            return sorted(self._installed)
+    
+    def _mark_installed(self, *packages: str):
+        with self._packages_lock:
+            self._installed.update(package.lower() for package in packages)
+    
+    def _replace_installed(self, packages: List[str]):
+        # An empty listing means pip failed; keep what we already know
+        if packages:
+            with self._packages_lock:
+                self._installed = set(packages)
+    
+    async def _acquire_install_lock(self):
+        """Wait for the install lock without blocking the event loop"""
+        while not self._install_lock.acquire(blocking=False):
+            await asyncio.sleep(0.1)
     
     def _get_installed_packages(self) -> List[str]:
         """Get a list of already installed packages"""
@@ -220,6 +599,65 @@ class CodeExecutorAgent:
             logger.error(f"Error getting installed packages: {e}")
             return []
     
+    async def _aget_installed_packages(self) -> List[str]:
+        """Get a list of already installed packages without blocking the event loop"""
+        try:
+            result = await self._arun_process([sys.executable, "-m", "pip", "list", "--format=json"])
+            if result.returncode == 0:
+                packages = json.loads(result.stdout)
+                return [pkg["name"].lower() for pkg in packages]
+            return []
+        except Exception as e:
+            logger.error(f"Error getting installed packages: {e}")
+            return []
+    
+    @staticmethod
+    async def _arun_process(args: List[str], timeout: Optional[float] = None,
+                            on_output: Optional[Callable[[str, str], None]] = None,
+                            cwd: Optional[str] = None) -> subprocess.CompletedProcess:
+        """Run a subprocess asynchronously, killing it on timeout or cancellation
+        
+        Output is read as it is produced and passed to `on_output` as
+        ("stdout" or "stderr", text) along the way.
+        """
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd
+        )
+        stdout: List[str] = []
+        stderr: List[str] = []
+        
+        async def read(stream: asyncio.StreamReader, name: str, chunks: List[str]):
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            while True:
+                data = await stream.read(4096)
+                text = decoder.decode(data, final=not data)
+                if text:
+                    chunks.append(text)
+                    if on_output:
+                        on_output(name, text)
+                if not data:
+                    return
+        
+        try:
+            await asyncio.wait_for(asyncio.gather(
+                read(process.stdout, "stdout", stdout),
+                read(process.stderr, "stderr", stderr),
+                process.wait()
+            ), timeout)
+        except asyncio.TimeoutError:
+            raise subprocess.TimeoutExpired(args, timeout)
+        finally:
+            if process.returncode is None:
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+        return subprocess.CompletedProcess(args, process.returncode, "".join(stdout), "".join(stderr))
+    
     def extract_required_packages(self, code: str) -> List[str]:
         """Extract required packages from code"""
         # Simple regex pattern to find import statements
@@ -239,36 +677,12 @@ class CodeExecutorAgent:
         # Filter out standard libraries
         packages = [match for match in matches if match not in std_libs]
         
-        # Map package names to PyPI names where they differ
-        package_mapping = {
-            'pygame': 'pygame',
-            'numpy': 'numpy',
-            'np': 'numpy',
-            'pd': 'pandas',
-            'pandas': 'pandas',
-            'sklearn': 'scikit-learn',
-            'matplotlib': 'matplotlib',
-            'plt': 'matplotlib',
-            'bs4': 'beautifulsoup4',
-            'PIL': 'pillow',
-            'cv2': 'opencv-python',
-            'tk': 'tk',
-            'tkinter': 'tk',
-            'requests': 'requests',
-            'flask': 'flask',
-            'django': 'django',
-            'tf': 'tensorflow',
-            'tensorflow': 'tensorflow',
-            'torch': 'torch',
-            'seaborn': 'seaborn',
-            'sns': 'seaborn'
-        }
         
         # Return list of required packages with proper PyPI names
         required = []
         for pkg in packages:
-            if pkg in package_mapping:
-                pkg_name = package_mapping[pkg]
+            if pkg in self.package_mapping:
+                pkg_name = self.package_mapping[pkg]
                 if pkg_name.lower() not in [p.lower() for p in required]:
                     required.append(pkg_name)
         
@@ -277,9 +691,14 @@ class CodeExecutorAgent:
     
     def is_package_installed(self, package_name: str) -> bool:
         """Check if a package is already installed"""
-        return package_name.lower() in [p.lower() for p in self.installed_packages]
+        with self._packages_lock:
+            return package_name.lower() in self._installed
     
     def install_required_packages(self, packages: List[str]) -> str:
+        """Install required packages using pip"""
+        return run_sync(self.ainstall_required_packages(packages))
+    
+    async def ainstall_required_packages(self, packages: List[str]) -> str:
         """Install required packages using pip"""
         if not packages:
             return ""
@@ -295,24 +714,41 @@ class CodeExecutorAgent:
                 output += f"⟳ {package} needs to be installed\n"
                 packages_to_install.append(package)
         
-        # Then install packages that need installation
+        if not packages_to_install:
+            return output
+        
+        # Then install packages that need installation, one request at a time
+        await self._acquire_install_lock()
+        try:
+            output += await self._ainstall_missing(packages_to_install)
+            # Update installed packages list after installations
+            self._replace_installed(await self._aget_installed_packages())
+        finally:
+            self._install_lock.release()
+        return output
+    
+    async def _ainstall_missing(self, packages_to_install: List[str]) -> str:
+        """pip install each package; call with the install lock held"""
+        output = ""
         for package in packages_to_install:
+            if self.is_package_installed(package):
+                # Installed by another request while we waited for the lock
+                output += f"✓ {package} was installed by another request\n"
+                continue
             try:
                 output += f"Installing {package}...\n"
                 
                 # First try normal installation (no --user flag)
                 try:
-                    result = subprocess.run(
+                    result = await self._arun_process(
                         [sys.executable, "-m", "pip", "install", package],
-                        capture_output=True,
-                        text=True,
                         timeout=120
                     )
                     
                     if result.returncode == 0:
                         output += f"✓ Successfully installed {package}\n"
                         # Add to installed packages list
-                        self.installed_packages.append(package.lower())
+                        self._mark_installed(package)
                     else:
                         output += f"✗ Failed to install {package}: {result.stderr}\n"
                         # Try alternative installation methods if standard method fails
@@ -326,15 +762,13 @@ class CodeExecutorAgent:
                             }
                             if package in alt_names:
                                 alt_package = alt_names[package]
-                                alt_result = subprocess.run(
+                                alt_result = await self._arun_process(
                                     [sys.executable, "-m", "pip", "install", alt_package],
-                                    capture_output=True,
-                                    text=True,
                                     timeout=120
                                 )
                                 if alt_result.returncode == 0:
                                     output += f"✓ Successfully installed {alt_package} (alternative for {package})\n"
-                                    self.installed_packages.append(alt_package.lower())
+                                    self._mark_installed(alt_package)
                                 else:
                                     output += f"✗ Failed to install alternative package: {alt_result.stderr}\n"
                         
@@ -344,41 +778,44 @@ class CodeExecutorAgent:
             except Exception as e:
                 output += f"✗ Error installing {package}: {str(e)}\n"
         
-        # Update installed packages list after installations
-        self.installed_packages = self._get_installed_packages()
         return output
     
-    def execute(self, code: str, timeout: int = 6000) -> Tuple[bool, str]:
+    def execute(self, code: str, timeout: int = 30,
+                on_output: Optional[Callable[[str, str], None]] = None, isolated: bool = False) -> Tuple[bool, str]:
         """Execute code and return result"""
+        return run_sync(self.aexecute(code, timeout, on_output, isolated))
+    
+    async def aexecute(self, code: str, timeout: int = 30,
+                       on_output: Optional[Callable[[str, str], None]] = None,
+                       isolated: bool = False) -> Tuple[bool, str]:
+        """Execute code and return result; `on_output` sees the program's output as it runs
+        
+        An isolated run gets a scratch working directory of its own, so
+        programs running side by side can't trip over each other's files.
+        """
         logger.info("Executing code")
         
         # First, extract and install required packages
         required_packages = self.extract_required_packages(code)
-        installation_output = self.install_required_packages(required_packages)
-        
-        # Check if code contains any GUI elements (Pygame, tkinter, etc.)
-        # as those might cause issues in headless environments
-        has_gui = any(pkg in ' '.join(required_packages).lower() for pkg in ['pygame', 'tk', 'matplotlib'])
+        installation_output = await self.ainstall_required_packages(required_packages)
         
-        # Add a warning for GUI applications
-        if has_gui:
-            installation_output += "\nNote: This code contains GUI elements and may require a display to run properly.\n\n"
+        # Never run past the request's overall deadline
+        try:
+            timeout = call_timeout(timeout)
+        except DeadlineExceeded as e:
+            logger.error(f"Skipping execution: {e}")
+            return False, str(e)
         
         # Save code to temporary file
-        with tempfile.NamedTemporaryFile(suffix='.py', delete=False) as temp_file:
+        workdir = tempfile.mkdtemp(prefix="run_") if isolated else None
+        with tempfile.NamedTemporaryFile(suffix='.py', delete=False, dir=workdir) as temp_file:
             temp_file_path = temp_file.name
             temp_file.write(code.encode('utf-8'))
         
         try:
             # Run code in subprocess
-            result = subprocess.run(
-                [sys.executable, temp_file_path],
-                capture_output=True,
-                text=True,
-                timeout=timeout
-            )
-            
-            os.unlink(temp_file_path)  # Clean up temp file
+            result = await self._arun_process([sys.executable, temp_file_path], timeout=timeout,
+                                              on_output=on_output, cwd=workdir)
             
             if result.returncode == 0:
                 output = installation_output + "\n" + result.stdout if installation_output else result.stdout
@@ -390,73 +827,25 @@ class CodeExecutorAgent:
                 return False, error
         
         except subprocess.TimeoutExpired:
-            os.unlink(temp_file_path)  # Clean up temp file
-            logger.error(f"Code execution timed out after {timeout} seconds")
-            return False, f"Execution timed out after {timeout} seconds"
+            logger.error(f"Code execution timed out after {timeout:.0f} seconds")
+            return False, f"Execution timed out after {timeout:.0f} seconds"
         
         except Exception as e:
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)  # Clean up temp file
             logger.error(f"Error during code execution: {str(e)}")
             return False, f"Error: {str(e)}"
-    
-    def execute(self, code: str, timeout: int = 30) -> Tuple[bool, str]:
-        """Execute code and return result"""
-        logger.info("Executing code")
-        
-        # First, extract and install required packages
-        required_packages = self.extract_required_packages(code)
-        installation_output = self.install_required_packages(required_packages)
-        
-        # Save code to temporary file
-        with tempfile.NamedTemporaryFile(suffix='.py', delete=False) as temp_file:
-            temp_file_path = temp_file.name
-            temp_file.write(code.encode('utf-8'))
         
-        try:
-            # Run code in subprocess
-            result = subprocess.run(
-                [sys.executable, temp_file_path],
-                capture_output=True,
-                text=True,
-                timeout=timeout
-            )
-            
-            os.unlink(temp_file_path)  # Clean up temp file
-            
-            if result.returncode == 0:
-                output = installation_output + "\n" + result.stdout if installation_output else result.stdout
-                logger.info("Code executed successfully")
-                return True, output
-            else:
-                error = installation_output + "\n" + result.stderr if installation_output else result.stderr
-                logger.error(f"Code execution failed: {error}")
-                return False, error
-        
-        except subprocess.TimeoutExpired:
-            os.unlink(temp_file_path)  # Clean up temp file
-            logger.error(f"Code execution timed out after {timeout} seconds")
-            return False, f"Execution timed out after {timeout} seconds"
-        
-        except Exception as e:
+        finally:
+            # Clean up temp file, also when the run is cancelled
             if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)  # Clean up temp file
-            logger.error(f"Error during code execution: {str(e)}")
-            return False, f"Error: {str(e)}"
+                os.unlink(temp_file_path)
+            if workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
 
 
 class CodeExplainerAgent:
     """Agent responsible for explaining code"""
     
-    def __init__(self, model="gpt-4-turbo-preview"):
-        self.model = model
-        logger.info(f"Initialized CodeExplainerAgent with model: {model}")
-    
-    def explain(self, code: str) -> str:
-        """Provide a clear explanation of how the code works"""
-        logger.info("Generating code explanation")
-        
-        system_prompt = """You are an expert Python education agent specialized in explaining code clearly.
+    system_prompt = """You are an expert Python education agent specialized in explaining code clearly.
 You break down complex concepts into simple explanations that even beginners can understand.
 Focus on explaining:
 1. The overall purpose of the code
@@ -464,6 +853,19 @@ Focus on explaining:
 3. Key programming concepts used
 4. The flow of execution
 5. How to use and modify the code"""
+    
+    def __init__(self, model="gpt-4-turbo-preview", gateway: Optional[LLMGateway] = None):
+        self.model = model
+        self.gateway = gateway or get_gateway()
+        logger.info(f"Initialized CodeExplainerAgent with model: {model}")
+    
+    @staticmethod
+    def prompt(code: str, model: str) -> Tuple[str, int]:
+        """User prompt and completion budget for explaining the code"""
+        # Long files are explained from their head rather than refused
+        code = truncate_to_tokens(code, EXPLAIN_CODE_TOKEN_LIMIT, model, keep="head",
+                                  marker="\n# ... (remaining code omitted)\n")
+        max_tokens = min(2000, max(600, count_tokens(code, model)))
         
         user_prompt = f"""Explain how this Python code works:
 ```python
@@ -471,30 +873,28 @@ Focus on explaining:
 ```
 
 Provide a clear, concise explanation with a focus on helping someone understand the code fully."""
+        return user_prompt, max_tokens
+    
+    def explain(self, code: str, model: Optional[str] = None) -> str:
+        """Provide a clear explanation of how the code works"""
+        return run_sync(self.aexplain(code, model))
+    
+    async def aexplain(self, code: str, model: Optional[str] = None) -> str:
+        """Provide a clear explanation of how the code works (`model` overrides the default)"""
+        logger.info("Generating code explanation")
+        model = model or self.model
+        
+        system_prompt = self.system_prompt
+        user_prompt, max_tokens = self.prompt(code, model)
         
         try:
-            if USE_NEW_OPENAI:
-                response = client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=0.3,
-                    max_tokens=2000
-                )
-                explanation = response.choices[0].message.content
-            else:
-                response = openai.ChatCompletion.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=0.3,
-                    max_tokens=2000
-                )
-                explanation = response.choices[0].message.content
+            explanation = await self.gateway.acomplete(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                model=model,
+                temperature=0.3,
+                max_tokens=max_tokens
+            )
             
             logger.info("Successfully generated code explanation")
             return explanation
@@ -507,22 +907,50 @@ Provide a clear, concise explanation with a focus on helping someone understand
 class CodeEnhancerAgent:
     """Agent responsible for enhancing code based on user feedback"""
     
-    def __init__(self, model="gpt-4.1-nano"):
-        self.model = model
-        logger.info(f"Initialized CodeEnhancerAgent with model: {model}")
-    
-    def enhance(self, code: str, feedback: str) -> str:
-        """Enhance code based on user feedback"""
-        logger.info(f"Enhancing code with feedback: {feedback[:100]}...")
-        
-        system_prompt = """You are an expert Python enhancement agent specialized in improving code based on user feedback.
+    system_prompt = """You are an expert Python enhancement agent specialized in improving code based on user feedback.
 Focus on:
 1. Implementing the requested changes accurately
 2. Maintaining code quality and readability
 3. Adding proper documentation for new features
 4. Ensuring backward compatibility
 5. Optimizing performance where possible"""
+    
+    def __init__(self, model="gpt-4.1-nano", gateway: Optional[LLMGateway] = None,
+                 mode: str = ENHANCER_MODE):
+        self.model = model
+        self.gateway = gateway or get_gateway()
+        self.mode = mode
+        logger.info(f"Initialized CodeEnhancerAgent with model: {model} (mode: {mode})")
+    
+    def enhance(self, code: str, feedback: str, mode: Optional[str] = None,
+                model: Optional[str] = None) -> str:
+        """Enhance code based on user feedback"""
+        return run_sync(self.aenhance(code, feedback, mode, model))
+    
+    async def aenhance(self, code: str, feedback: str, mode: Optional[str] = None,
+                       model: Optional[str] = None) -> str:
+        """Enhance code based on user feedback
+        
+        In "diff" mode the model returns SEARCH/REPLACE edits that are applied
+        locally; if they don't apply cleanly or the result doesn't compile, the
+        full-file round trip is used instead.
+        """
+        logger.info(f"Enhancing code with feedback: {feedback[:100]}...")
+        mode = mode or self.mode
+        model = model or self.model
+        
+        code_tokens = count_tokens(code, model)
+        if code_tokens > MAX_CODE_TOKENS:
+            logger.warning(f"Skipping enhancement: code is {code_tokens} tokens (limit {MAX_CODE_TOKENS})")
+            return code
         
+        if mode == "diff":
+            enhanced_code = await self._aenhance_with_edits(code, feedback, code_tokens, model)
+            if enhanced_code is not None:
+                return enhanced_code
+            logger.info("Falling back to full-file enhancement")
+        
+        system_prompt = self.system_prompt
         user_prompt = f"""Enhance this Python code based on the following feedback:
 FEEDBACK:
 {feedback}
@@ -535,34 +963,17 @@ CODE:
 Return ONLY the complete enhanced code with no explanations."""
         
         try:
-            if USE_NEW_OPENAI:
-                response = client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=0.2,
-                    max_tokens=4000
-                )
-                enhanced_code = response.choices[0].message.content
-            else:
-                response = openai.ChatCompletion.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=0.2,
-                    max_tokens=4000
-                )
-                enhanced_code = response.choices[0].message.content
+            # Enhancements usually add code, so leave more headroom than a plain rewrite
+            enhanced_code = await self.gateway.acomplete(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                model=model,
+                temperature=0.2,
+                max_tokens=rewrite_budget(code_tokens, ratio=1.5, overhead=512)
+            )
             
             # Extract code from potential markdown format
-            if "```python" in enhanced_code and "```" in enhanced_code.split("```python", 1)[1]:
-                enhanced_code = enhanced_code.split("```python", 1)[1].split("```", 1)[0].strip()
-            elif "```" in enhanced_code:
-                enhanced_code = enhanced_code.split("```", 1)[1].split("```", 1)[0].strip()
+            enhanced_code = extract_code_block(enhanced_code)
             
             logger.info("Successfully enhanced code")
             return enhanced_code
@@ -570,108 +981,734 @@ Return ONLY the complete enhanced code with no explanations."""
         except Exception as e:
             logger.error(f"Error enhancing code: {str(e)}")
             return code  # Return original code if enhancement fails
+    
+    async def _aenhance_with_edits(self, code: str, feedback: str, code_tokens: int,
+                                   model: str) -> Optional[str]:
+        """Ask for SEARCH/REPLACE edits and apply them; returns None if that fails"""
+        user_prompt = f"""Enhance this Python code based on the following feedback:
+FEEDBACK:
+{feedback}
+
+CODE:
+```python
+{code}
+```
+
+Do NOT return the whole file. Describe the changes as one or more SEARCH/REPLACE blocks in exactly this format:
+
+{SEARCH_MARKER}
+lines copied exactly from the current code
+{DIVIDER_MARKER}
+the lines that replace them
+{REPLACE_MARKER}
+
+Each SEARCH section must match the current code exactly, including indentation, and must be unique in the file.
+Keep SEARCH sections short: just enough lines to be unique. Return ONLY the blocks with no explanations."""
+        
+        try:
+            response = await self.gateway.acomplete(
+                system_prompt=self.system_prompt,
+                user_prompt=user_prompt,
+                model=model,
+                temperature=0.2,
+                # Edits are a fraction of the file; a full rewrite is the fallback if they don't fit
+                max_tokens=max(1024, code_tokens // 2)
+            )
+            enhanced_code = apply_edits(code, parse_edits(response))
+            compile(enhanced_code, "<enhanced>", "exec")
+        except (PatchError, SyntaxError) as e:
+            logger.warning(f"Could not apply enhancement edits: {str(e)}")
+            return None
+        except Exception as e:
+            logger.error(f"Error requesting enhancement edits: {str(e)}")
+            return None
+        
+        logger.info(f"Applied enhancement edits ({len(response)} characters of edits for a {len(code)} character file)")
+        return enhanced_code
+
+
+class DebugPassStats:
+    """How much the preventive debugging pass earns its round trip
+    
+    With the pass on, counts how often it changed the code and how long it
+    took; in execute-first mode, how often the unreviewed code failed its
+    first run and needed the debugger after all.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"runs": 0, "changed": 0, "seconds": 0.0, "skipped": 0, "first_run_failures": 0}
+    
+    def record_run(self, code: str, debugged_code: str, elapsed: float):
+        with self._lock:
+            self._stats["runs"] += 1
+            self._stats["seconds"] += elapsed
+            if debugged_code.strip() != code.strip():
+                self._stats["changed"] += 1
+    
+    def record_skipped(self, success: bool):
+        with self._lock:
+            self._stats["skipped"] += 1
+            if not success:
+                self._stats["first_run_failures"] += 1
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        runs, skipped, seconds = stats["runs"], stats["skipped"], stats.pop("seconds")
+        stats["change_rate"] = round(stats["changed"] / runs, 3) if runs else None
+        stats["mean_seconds"] = round(seconds / runs, 3) if runs else None
+        stats["first_run_failure_rate"] = round(stats["first_run_failures"] / skipped, 3) if skipped else None
+        return stats
+
+
+class RepairLoopStats:
+    """How often repair loops cut a futile round short
+    
+    Counts repair rounds, and loops stopped either because the debugger
+    returned code that had already failed (so it wasn't executed) or because
+    an error signature repeated.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"loops": 0, "rounds": 0, "unchanged_skipped": 0, "stopped_on_repeat": 0}
+    
+    def record(self, key: str, count: int = 1):
+        with self._lock:
+            self._stats[key] += count
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats)
 
 
 class SpeechToCodeOrchestrator:
     """Orchestrator that coordinates the different agents"""
     
-    def __init__(self):
+    def __init__(self, result_cache: Optional[ResponseCache] = None, router: Optional[ModelRouter] = None,
+                 execute_first: bool = EXECUTE_FIRST, candidates: int = SPECULATIVE_CANDIDATES,
+                 catalog: Optional[Catalog] = None):
         self.generator = CodeGeneratorAgent()
         self.debugger = CodeDebuggerAgent()
         self.executor = CodeExecutorAgent()
         self.explainer = CodeExplainerAgent()
         self.enhancer = CodeEnhancerAgent()
+        self.result_cache = result_cache if result_cache is not None else pipeline_cache
+        self.router = router or get_router()
+        self.execute_first = execute_first
+        self.candidates = max(1, candidates)
+        self.debug_stats = DebugPassStats()
+        self.repair_stats = RepairLoopStats()
+        self.explanations = ExplanationStore(self._aexplain_routed)
+        self.catalog = catalog if catalog is not None else Catalog() if FAST_PATH else None
         logger.info("Initialized SpeechToCodeOrchestrator")
     
-    def process_request(self, text_request: str) -> Dict:
+    def process_request(self, text_request: str, force_regenerate: bool = False,
+                        deadline: Optional[float] = PIPELINE_DEADLINE,
+                        progress: Optional[ProgressChannel] = None) -> Dict:
         """Process a text request through the agent pipeline"""
+        return run_sync(self.aprocess_request(text_request, force_regenerate, deadline, progress))
+    
+    async def aprocess_request(self, text_request: str, force_regenerate: bool = False,
+                               deadline: Optional[float] = PIPELINE_DEADLINE,
+                               progress: Optional[ProgressChannel] = None) -> Dict:
+        """Process a text request through the agent pipeline
+        
+        Requests for a program in the catalog (a plain Snake game, calculator or
+        todo list) are answered with its verified version straight away.
+        Successful results are cached on the normalized transcript; pass
+        `force_regenerate=True` to bypass the catalog and cache and run the
+        full pipeline.
+        The result doesn't wait for the explanation: fetch it by its
+        "explanation_id" from `self.explanations`.
+        The whole pipeline shares one `deadline` (seconds): every LLM call and
+        execution gets the remaining budget as its timeout, and repair attempts
+        stop once it has run out. Stage events, code as it is generated and
+        execution output are reported to `progress` as they happen.
+        """
         logger.info(f"Processing request: {text_request}")
-        
-        # Step 1: Generate initial code
-        generated_code = self.generator.generate(text_request)
-        
-        # Step 2: Preventive debugging (without specific error)
-        debugged_code = self.debugger.debug(generated_code)
-        
-        # Step 3: Try to execute the code
-        success, output = self.executor.execute(debugged_code)
-        
-        # Step 4: If execution failed, debug with the specific error
-        if not success:
-            logger.info("Initial execution failed, attempting to fix...")
-            fixed_code = self.debugger.debug(debugged_code, output)
-            
-            # Try execution again
-            success, output = self.executor.execute(fixed_code)
+        normalized = normalize_transcript(text_request)
+        cache_key = make_cache_key("process_request", self.router.signature, normalized)
+        
+        if not force_regenerate and self.catalog is not None:
+            entry = self.catalog.match(normalized)
+            if entry is not None:
+                logger.info(f"Serving catalog program {entry.entry_id} v{entry.version} for: {text_request}")
+                return self._serve_catalog(entry)
+        
+        if not force_regenerate:
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Serving cached result for: {text_request}")
+                self._ensure_saved(cached["filename"], cached["code"])
+                if EXPLAIN_MODE == "on-demand":
+                    explanation_id = self.explanations.register(cached["code"])
+                else:
+                    explanation_id = self.explanations.start(cached["code"])
+                return dict(cached, explanation=self.explanations.peek(explanation_id),
+                            explanation_id=explanation_id, cached=True)
+        
+        with deadline_scope(deadline), progress_scope(progress):
+            result = await self._arun_pipeline(text_request)
+        if result["success"]:
+            # Timings describe this run only; the explanation lives in the explanation store
+            self.result_cache.set(cache_key, {k: v for k, v in result.items() if k not in ("timings", "explanation")})
+        return dict(result, cached=False)
+    
+    @staticmethod
+    def _out_of_time(stage: str) -> bool:
+        """True (and logged) when the request deadline leaves no time for another stage"""
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            logger.warning(f"Request deadline reached, skipping {stage}")
+            return True
+        return False
+    
+    def _serve_catalog(self, entry: CatalogEntry) -> Dict:
+        """Result for a catalog program, with its recorded output and curated explanation"""
+        filename = f"catalog_{entry.entry_id}_v{entry.version}.py"
+        self._ensure_saved(filename, entry.code)
+        explanation_id = self.explanations.explanation_id(entry.code)
+        if self.explanations.peek(explanation_id) != entry.explanation:
+            self.explanations.put(entry.code, entry.explanation)
+        return {
+            "success": True,
+            "code": entry.code,
+            "output": entry.output,
+            "explanation": entry.explanation,
+            "explanation_id": explanation_id,
+            "filename": filename,
+            "catalog": {"id": entry.entry_id, "version": entry.version, "catalog_version": self.catalog.version},
+            "cached": True
+        }
+    
+    def _ensure_saved(self, filename: str, code: str):
+        """Re-write a cached result's file if it has been removed from disk"""
+        filepath = GENERATED_CODE_DIR / filename
+        if not filepath.exists():
+            with open(filepath, 'w') as f:
+                f.write(code)
+    
+    def _route(self, stage: str, text: str, attempt: int = 0) -> Route:
+        """Route a stage from the size of its input"""
+        return self.router.route(stage, count_tokens(text, self.router.tiers[0]), attempt)
+    
+    async def _agenerate_routed(self, text_request: str) -> str:
+        """Generate on the fastest tier, escalating while the result doesn't compile"""
+        attempt = 0
+        while True:
+            route = self._route("generate", text_request, attempt)
+            try:
+                code = await self.generator.agenerate(
+                    text_request, model=route.model,
+                    on_code=lambda delta, attempt=attempt: emit("code", delta=delta, attempt=attempt)
+                )
+            except CodeGenerationError:
+                self.router.record(route, False)
+                raise
+            code = repair(code)
+            valid = compiles(code)
+            self.router.record(route, valid)
+            if valid or not self.router.can_escalate(route) or self._out_of_time("regeneration"):
+                return code
+            logger.info(f"Code from {route.model} does not compile, escalating")
+            attempt += 1
+    
+    async def _adebug(self, code: str) -> Tuple[str, Optional[Route], float]:
+        """Preventive debugging pass; returns the code, its route and the seconds it took
+        
+        In execute-first mode the pass is skipped and the code is returned as
+        is, with no route; the debugger then only sees code that failed.
+        """
+        if self.execute_first:
+            return code, None, 0.0
+        route = self._route("debug", code)
+        debugged_code = self._keep_unbroken(code, repair(await self.debugger.adebug(code, model=route.model)))
+        elapsed = time.monotonic() - route.started
+        self.debug_stats.record_run(code, debugged_code, elapsed)
+        return debugged_code, route, elapsed
+    
+    @staticmethod
+    def _keep_unbroken(code: str, debugged_code: str) -> str:
+        """The preventive pass's output, or the original if the pass broke code that compiled"""
+        if compiles(code) and not compiles(debugged_code):
+            logger.warning("Preventive debugging broke the code, keeping the original")
+            return code
+        return debugged_code
+    
+    async def _averify(self, debugged: Tuple[str, Optional[Route], float], max_repairs: int, trace: PipelineTrace,
+                       on_candidate: Optional[Callable[[str], None]] = None) -> Tuple[str, bool, str]:
+        """Execute the debugged code and repair it on failure; returns (code, success, output)
+        
+        Each repair runs on the next model tier, and the debugger's outcome is
+        the execution result that follows it. The loop stops without executing
+        a fix identical to code that already failed, and as soon as an error
+        signature repeats. `on_candidate` is told about each candidate just
+        before it runs, so speculative work can follow the code.
+        """
+        debugged_code, route, elapsed = debugged
+        with trace.span("execute#0"):
+            success, output = await self._aexecute_checked(debugged_code, on_candidate)
+        if route is None:
+            self.debug_stats.record_skipped(success)
+        else:
+            self.router.record(route, success, elapsed)
+        if success:
+            return debugged_code, success, output
+        
+        tracker = RepairTracker()
+        tracker.record(debugged_code, output)
+        self.repair_stats.record("loops")
+        candidate = debugged_code
+        for attempt in range(1, max_repairs + 1):
+            if self._out_of_time("repair"):
+                break
+            logger.info(f"Execution failed, repair attempt {attempt} of {max_repairs}...")
+            self.repair_stats.record("rounds")
+            route = self._route("repair", candidate, attempt)
+            with trace.span(f"repair#{attempt}"):
+                fix = repair(await self.debugger.adebug(candidate, output, model=route.model))
+            elapsed = time.monotonic() - route.started
+            if tracker.tried(fix):
+                # Running it again could only repeat its error
+                logger.info("The debugger returned code that already failed, stopping repairs")
+                self.repair_stats.record("unchanged_skipped")
+                self.router.record(route, False, elapsed)
+                break
+            candidate = fix
+            with trace.span(f"execute#{attempt}"):
+                success, output = await self._aexecute_checked(candidate, on_candidate)
+            self.router.record(route, success, elapsed)
             if success:
-                debugged_code = fixed_code
-            else:
-                # One more attempt with a different approach
-                logger.info("Second execution failed, final debugging attempt...")
-                final_code = self.debugger.debug(fixed_code, output)
-                success, output = self.executor.execute(final_code)
+                return candidate, success, output
+            if tracker.record(candidate, output):
+                logger.info("Same error as an earlier attempt, stopping repairs")
+                self.repair_stats.record("stopped_on_repeat")
+                break
+        return debugged_code, success, output
+    
+    async def _agenerate_candidates(self, text_request: str) -> List[str]:
+        """Generate several programs at once at spread temperatures, escalating while none compiles"""
+        attempt = 0
+        while True:
+            route = self._route("generate", text_request, attempt)
+            on_code = lambda delta, attempt=attempt: emit("code", delta=delta, attempt=attempt)
+            outputs = await asyncio.gather(*(
+                # Only the lowest-temperature candidate streams its code to progress subscribers
+                self.generator.agenerate(text_request, model=route.model, temperature=temperature,
+                                         on_code=on_code if index == 0 else None)
+                for index, temperature in enumerate(candidate_temperatures(self.candidates))
+            ), return_exceptions=True)
+            errors = [output for output in outputs if isinstance(output, BaseException)]
+            if len(errors) == len(outputs):
+                self.router.record(route, False)
+                raise errors[0]
+            codes = list(dict.fromkeys(repair(output) for output in outputs if isinstance(output, str)))
+            valid = [code for code in codes if compiles(code)]
+            self.router.record(route, bool(valid))
+            if valid or not self.router.can_escalate(route) or self._out_of_time("regeneration"):
+                return valid or codes
+            logger.info(f"No candidate from {route.model} compiles, escalating")
+            attempt += 1
+    
+    async def _arace(self, candidates: List[str], max_repairs: int, trace: PipelineTrace,
+                     on_candidate: Optional[Callable[[str], None]] = None) -> Tuple[str, bool, str]:
+        """Execute candidates side by side, keeping the first that passes; returns (code, success, output)
+        
+        This stands in for the preventive debugging pass. If every candidate
+        fails, each repair round asks the debugger for several fixes of the
+        lead candidate at spread temperatures, on the next model tier, and
+        races those the same way. Fixes identical to code that already failed
+        aren't executed, and the rounds stop once no fix is new or the lead's
+        error repeats.
+        """
+        code, success, output = await self._afirst_passing(candidates, 0, trace, on_candidate)
+        if success:
+            return code, success, output
+        
+        tracker = RepairTracker()
+        for candidate in candidates:
+            tracker.failed(candidate)
+        tracker.record(code, output)
+        self.repair_stats.record("loops")
+        best = code
+        for attempt in range(1, max_repairs + 1):
+            if self._out_of_time("repair"):
+                break
+            logger.info(f"All candidates failed, repair round {attempt} of {max_repairs}...")
+            self.repair_stats.record("rounds")
+            route = self._route("repair", code, attempt)
+            with trace.span(f"repair#{attempt}"):
+                fixes = await asyncio.gather(*(
+                    self.debugger.adebug(code, output, model=route.model, temperature=temperature)
+                    for temperature in candidate_temperatures(self.candidates)
+                ))
+            elapsed = time.monotonic() - route.started
+            fixes = list(dict.fromkeys(repair(fix) for fix in fixes))
+            new_fixes = [fix for fix in fixes if not tracker.tried(fix)]
+            if not new_fixes:
+                logger.info("The debugger returned only code that already failed, stopping repairs")
+                self.repair_stats.record("unchanged_skipped")
+                self.router.record(route, False, elapsed)
+                break
+            code, success, output = await self._afirst_passing(new_fixes, attempt, trace, on_candidate)
+            self.router.record(route, success, elapsed)
+            if success:
+                return code, success, output
+            for fix in new_fixes:
+                tracker.failed(fix)
+            if tracker.record(code, output):
+                logger.info("Same error as an earlier round, stopping repairs")
+                self.repair_stats.record("stopped_on_repeat")
+                break
+        return best, success, output
+    
+    async def _afirst_passing(self, codes: List[str], attempt: int, trace: PipelineTrace,
+                              on_candidate: Optional[Callable[[str], None]] = None) -> Tuple[str, bool, str]:
+        """Execute every candidate at once in isolated runs; the first to pass wins and the rest are cancelled
+        
+        Returns the winner, or the lead (first) candidate and its output if none
+        passes. Only the lead candidate is explained speculatively and reports
+        progress, so the rest don't interleave with it.
+        """
+        async def run(index: int, code: str) -> Tuple[int, bool, str]:
+            with trace.span(f"execute#{attempt}.{index}"):
+                success, output = await self._aexecute_checked(code, on_candidate if index == 0 else None,
+                                                               isolated=True)
+            return index, success, output
+        
+        tasks = [asyncio.ensure_future(run(0, codes[0]))]
+        with silenced():
+            tasks += [asyncio.ensure_future(run(index, code)) for index, code in enumerate(codes[1:], 1)]
+        outputs: Dict[int, str] = {}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, success, output = await next_done
+                outputs[index] = output
                 if success:
-                    debugged_code = final_code
-        
-        # Step 5: Generate explanation
-        explanation = self.explainer.explain(debugged_code)
-        
-        # Generate a unique filename and save the code
-        timestamp = int(time.time())
-        filename = f"code_{timestamp}.py"
-        filepath = GENERATED_CODE_DIR / filename
-        
-        with open(filepath, 'w') as f:
-            f.write(debugged_code)
-        
+                    if len(codes) > 1:
+                        logger.info(f"Candidate {index + 1} of {len(codes)} passed first, cancelling the rest")
+                    if index:
+                        emit("candidate", code=codes[index])
+                    return codes[index], True, output
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return codes[0], False, outputs[0]
+    
+    async def _aexecute_checked(self, code: str, on_candidate: Optional[Callable[[str], None]] = None,
+                                isolated: bool = False) -> Tuple[bool, str]:
+        """Execute code that passes the static check; otherwise fail with its report
+        
+        Syntax errors, prose, undefined names and missing imports are reported
+        without spawning a subprocess, in a traceback-like form the debugger
+        can localize.
+        """
+        diagnostics = validate(code, self.executor.package_mapping)
+        if diagnostics:
+            logger.info(f"Static check found {len(diagnostics)} problem(s), skipping execution")
+            report = format_report(code, diagnostics)
+            emit("output", stream="static_check", text=report)
+            return False, report
+        if on_candidate:
+            on_candidate(code)
+        emit("candidate", code=code)
+        return await self.executor.aexecute(code, on_output=lambda stream, text: emit("output", stream=stream, text=text),
+                                            isolated=isolated)
+    
+    async def _aexplain_routed(self, code: str) -> str:
+        """Explain on the fastest tier, escalating once if the explanation fails"""
+        route = self._route("explain", code)
+        explanation = await self.explainer.aexplain(code, model=route.model)
+        valid = bool(explanation.strip()) and not explanation.startswith("Error generating explanation")
+        self.router.record(route, valid)
+        if not valid and self.router.can_escalate(route) and not self._out_of_time("explanation retry"):
+            route = self._route("explain", code, attempt=1)
+            explanation = await self.explainer.aexplain(code, model=route.model)
+            self.router.record(route, not explanation.startswith("Error generating explanation"))
+        return explanation
+    
+    async def _arun_pipeline(self, text_request: str) -> Dict:
+        """Run generate, debug, execute and explain for a text request
+        
+        Every stage starts on the fastest model tier and moves to a stronger one
+        only when its output fails validation or execution.
+        """
+        generate = self._agenerate_candidates if self.candidates > 1 else self._agenerate_routed
+        return await self._arun_graph("generate", lambda: generate(text_request), MAX_REPAIR_ATTEMPTS, "code")
+    
+    async def _arun_graph(self, source_stage: str, source: Callable[[], Awaitable[Union[str, List[str]]]],
+                          max_repairs: int, file_prefix: str) -> Dict:
+        """Run the stage DAG that turns a source stage's code into a verified, explained result
+        
+            source -> debug -> verify -> explain
+                                      -> save
+        
+        The explain stage doesn't wait for the explanation: it hands the final
+        code to the explanation store and returns its ID, and the result carries
+        "explanation_id" (with "explanation" set only if it was already known).
+        In speculative EXPLAIN_MODE explanation starts on each candidate while
+        it executes and is cancelled when a repair replaces the code. With
+        several candidates the debug stage is dropped and verify races them
+        (the source may return a list). Per-stage timings are returned under
+        "timings".
+        """
+        trace = PipelineTrace(listener=lambda name, kind, status: emit("stage", stage=name, kind=kind, status=status))
+        speculated: List[str] = []
+        
+        def on_candidate(code: str):
+            if speculated and speculated[-1] != code:
+                # A repair replaced the code being explained
+                self.explanations.cancel(speculated[-1])
+            speculated.append(code)
+            self.explanations.start(code)
+        
+        async def explain(verify) -> str:
+            code = verify[0]
+            for stale in speculated:
+                if stale != code:
+                    self.explanations.cancel(stale)
+            if EXPLAIN_MODE == "on-demand":
+                return self.explanations.register(code)
+            return self.explanations.start(code)
+        
+        speculate = on_candidate if EXPLAIN_MODE == "speculative" else None
+        
+        graph = StageGraph()
+        graph.add(source_stage, source)
+        if self.candidates > 1:
+            as_list = lambda codes: codes if isinstance(codes, list) else [codes]
+            graph.add("verify", lambda **deps: self._arace(as_list(deps[source_stage]), max_repairs, trace, speculate),
+                      source_stage)
+        else:
+            graph.add("debug", lambda **deps: self._adebug(deps[source_stage]), source_stage)
+            graph.add("verify", lambda debug: self._averify(debug, max_repairs, trace, speculate), "debug")
+        graph.add("explain", explain, "verify")
+        graph.add("save", lambda verify: self._asave(file_prefix, verify[0]), "verify")
+        try:
+            results = await graph.run(trace)
+        except BaseException:
+            for code in speculated:
+                self.explanations.cancel(code)
+            raise
+        
+        code, success, output = results["verify"]
+        timings = trace.summary()
+        logger.info(f"Pipeline took {timings['wall_seconds']}s for {timings['work_seconds']}s of work "
+                    f"(critical path: {' -> '.join(timings['critical_path'])})")
         return {
             "success": success,
-            "code": debugged_code,
+            "code": code,
             "output": output,
-            "explanation": explanation,
-            "filename": filename
+            "explanation": self.explanations.peek(results["explain"]),
+            "explanation_id": results["explain"],
+            "filename": results["save"],
+            "timings": timings
         }
     
-    def enhance_code(self, code: str, feedback: str) -> Dict:
-        """Enhance existing code based on user feedback"""
-        logger.info(f"Enhancing code with feedback: {feedback[:100]}...")
-        
-        enhanced_code = self.enhancer.enhance(code, feedback)
-        
-        # Debug the enhanced code
-        debugged_code = self.debugger.debug(enhanced_code)
-        
-        # Try to execute
-        success, output = self.executor.execute(debugged_code)
-        
-        # If execution failed, debug with the specific error
-        if not success:
-            logger.info("Enhanced code execution failed, attempting to fix...")
-            fixed_code = self.debugger.debug(debugged_code, output)
-            
-            # Try execution again
-            success, output = self.executor.execute(fixed_code)
-            if success:
-                debugged_code = fixed_code
-        
-        # Generate explanation of changes
-        explanation = self.explainer.explain(debugged_code)
-        
-        # Generate a unique filename and save the code
+    async def _asave(self, prefix: str, code: str) -> str:
+        """Save the code under a unique filename and return the filename"""
         timestamp = int(time.time())
-        filename = f"enhanced_{timestamp}.py"
+        filename = f"{prefix}_{timestamp}.py"
         filepath = GENERATED_CODE_DIR / filename
         
         with open(filepath, 'w') as f:
-            f.write(debugged_code)
-        
-        return {
-            "success": success,
-            "code": debugged_code,
-            "output": output,
-            "explanation": explanation,
-            "filename": filename
+            f.write(code)
+        return filename
+    
+    def process_batch(self, prompts: List[str], poll_interval: float = LLM_BATCH_POLL_INTERVAL,
+                      workers: int = BULK_EXECUTION_WORKERS) -> List[Dict]:
+        """Process many text requests at once through the Batch API"""
+        return run_sync(self.aprocess_batch(prompts, poll_interval, workers))
+    
+    async def aprocess_batch(self, prompts: List[str], poll_interval: float = LLM_BATCH_POLL_INTERVAL,
+                             workers: int = BULK_EXECUTION_WORKERS) -> List[Dict]:
+        """Process many text requests at once through the Batch API
+        
+        Each stage (generation, preventive debugging, each repair round and
+        explanation) is submitted as one batch for all prompts still in play,
+        and execution runs locally with `workers` programs at a time. Results
+        come back in prompt order; successful ones are also stored in the
+        pipeline cache, so interactive requests for the same prompt are instant.
+        """
+        gateway = self.generator.gateway
+        semaphore = asyncio.Semaphore(workers)
+        results: List[Dict] = [{"prompt": prompt, "success": False} for prompt in prompts]
+        
+        async def run_stage(stage: str, items: Dict[int, Tuple[Route, str, str, float, int]]) -> Dict[int, Optional[str]]:
+            """Submit one batch for a stage; items map index -> (route, system, user, temperature, max_tokens)"""
+            if not items:
+                return {}
+            requests = [
+                {
+                    "custom_id": f"{stage}-{index}",
+                    "model": route.model,
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    "temperature": temperature,
+                    "max_tokens": max_tokens
+                }
+                for index, (route, system_prompt, user_prompt, temperature, max_tokens) in items.items()
+            ]
+            logger.info(f"Bulk {stage}: submitting {len(requests)} requests")
+            contents = await gateway.abatch(requests, poll_interval=poll_interval)
+            return {index: contents.get(f"{stage}-{index}") for index in items}
+        
+        async def execute(index: int, code: str) -> Tuple[int, bool, str]:
+            async with semaphore:
+                success, output = await self._aexecute_checked(code)
+                return index, success, output
+        
+        def rewrite_items(stage: str, codes: Dict[int, str], errors: Dict[int, str], attempt: int = 0):
+            items = {}
+            for index, code in codes.items():
+                route = self._route(stage, code, attempt)
+                code_tokens = count_tokens(code, route.model)
+                if code_tokens > MAX_CODE_TOKENS:
+                    continue
+                error = self.debugger.trim_error(errors[index], route.model) if index in errors else None
+                items[index] = (route, self.debugger.system_prompt, self.debugger.rewrite_prompt(code, error),
+                                0.2, rewrite_budget(code_tokens))
+            return items
+        
+        # Step 1: Generate code for every prompt
+        items = {
+            index: (self._route("generate", prompt), self.generator.system_prompt,
+                    self.generator.user_prompt(prompt), 0.2, 4000)
+            for index, prompt in enumerate(prompts)
         }
+        codes: Dict[int, str] = {}
+        for index, content in (await run_stage("generate", items)).items():
+            code = repair(extract_code_block(content)) if content else ""
+            self.router.record(items[index][0], compiles(code))
+            if code.strip():
+                codes[index] = code
+            else:
+                results[index]["error"] = "Code generation failed"
+        
+        # Step 2: Preventive debugging, unless execute-first mode skips it
+        items = {} if self.execute_first else rewrite_items("debug", codes, {})
+        for index, content in (await run_stage("debug", items)).items():
+            if content:
+                code = codes[index]
+                codes[index] = self._keep_unbroken(code, repair(extract_code_block(content)))
+                self.debug_stats.record_run(code, codes[index], time.monotonic() - items[index][0].started)
+        
+        # Step 3: Execute locally in parallel
+        outcomes = await asyncio.gather(*(execute(index, code) for index, code in codes.items()))
+        executed = {index: (success, output) for index, success, output in outcomes}
+        for index, route in ((index, item[0]) for index, item in items.items()):
+            self.router.record(route, executed[index][0])
+        if self.execute_first:
+            for success, _ in executed.values():
+                self.debug_stats.record_skipped(success)
+        
+        # Step 4: Repair rounds for the failures, each on a stronger tier. A prompt
+        # drops out once its error repeats or its fix is code that already failed
+        candidates = dict(codes)
+        trackers: Dict[int, RepairTracker] = {}
+        for index, (success, output) in executed.items():
+            if not success:
+                trackers[index] = RepairTracker()
+                trackers[index].record(candidates[index], output)
+        self.repair_stats.record("loops", len(trackers))
+        for attempt in range(1, MAX_REPAIR_ATTEMPTS + 1):
+            failed = {index: candidates[index] for index in trackers if not executed[index][0]}
+            if not failed:
+                break
+            self.repair_stats.record("rounds", len(failed))
+            errors = {index: executed[index][1] for index in failed}
+            items = rewrite_items("repair", failed, errors, attempt)
+            repaired = {}
+            for index, content in (await run_stage(f"repair{attempt}", items)).items():
+                if not content:
+                    continue
+                fix = repair(extract_code_block(content))
+                if trackers[index].tried(fix):
+                    self.repair_stats.record("unchanged_skipped")
+                    self.router.record(items[index][0], False)
+                    del trackers[index]
+                else:
+                    repaired[index] = fix
+            candidates.update(repaired)
+            outcomes = await asyncio.gather(*(execute(index, code) for index, code in repaired.items()))
+            for index, success, output in outcomes:
+                executed[index] = (success, output)
+                self.router.record(items[index][0], success)
+                if success:
+                    codes[index] = repaired[index]
+                elif trackers[index].record(repaired[index], output):
+                    self.repair_stats.record("stopped_on_repeat")
+                    del trackers[index]
+        
+        # Step 5: Explain everything that produced code
+        items = {}
+        for index, code in codes.items():
+            route = self._route("explain", code)
+            user_prompt, max_tokens = self.explainer.prompt(code, route.model)
+            items[index] = (route, self.explainer.system_prompt, user_prompt, 0.3, max_tokens)
+        explanations = await run_stage("explain", items)
+        
+        timestamp = int(time.time())
+        for index, code in codes.items():
+            explanation = explanations.get(index)
+            self.router.record(items[index][0], bool(explanation))
+            if explanation:
+                self.explanations.put(code, explanation)
+            success, output = executed.get(index, (False, ""))
+            filename = f"bulk_{timestamp}_{index}.py"
+            with open(GENERATED_CODE_DIR / filename, 'w') as f:
+                f.write(code)
+            result = {
+                "success": success,
+                "code": code,
+                "output": output,
+                "explanation": explanation or "Error generating explanation",
+                "explanation_id": self.explanations.explanation_id(code),
+                "filename": filename
+            }
+            if success:
+                cache_key = make_cache_key("process_request", self.router.signature, normalize_transcript(prompts[index]))
+                self.result_cache.set(cache_key, {k: v for k, v in result.items() if k != "explanation"})
+            results[index].update(result)
+        return results
+    
+    def enhance_code(self, code: str, feedback: str,
+                     deadline: Optional[float] = PIPELINE_DEADLINE,
+                     progress: Optional[ProgressChannel] = None) -> Dict:
+        """Enhance existing code based on user feedback"""
+        return run_sync(self.aenhance_code(code, feedback, deadline, progress))
+    
+    async def aenhance_code(self, code: str, feedback: str,
+                            deadline: Optional[float] = PIPELINE_DEADLINE,
+                            progress: Optional[ProgressChannel] = None) -> Dict:
+        """Enhance existing code based on user feedback, within one overall deadline"""
+        logger.info(f"Enhancing code with feedback: {feedback[:100]}...")
+        with deadline_scope(deadline), progress_scope(progress):
+            return await self._arun_enhancement(code, feedback)
+    
+    async def _arun_enhancement(self, code: str, feedback: str) -> Dict:
+        """Run enhance, debug, execute and explain for a piece of feedback"""
+        # The enhanced code is executed and fixed once if that fails
+        return await self._arun_graph("enhance", lambda: self._aenhance_routed(code, feedback), 1, "enhanced")
+    
+    async def _aenhance_routed(self, code: str, feedback: str) -> str:
+        """Enhance on the fastest tier, escalating while the result is rejected"""
+        attempt = 0
+        while True:
+            route = self._route("enhance", code + feedback, attempt)
+            enhanced_code = repair(await self.enhancer.aenhance(code, feedback, model=route.model))
+            # The enhancer hands back the original code when it fails
+            valid = enhanced_code != code and compiles(enhanced_code)
+            self.router.record(route, valid)
+            if valid or not self.router.can_escalate(route) or self._out_of_time("enhancement retry"):
+                return enhanced_code
+            logger.info(f"Enhancement from {route.model} was rejected, escalating")
+            attempt += 1
     
     def transcribe_audio(self, audio_file_path: str) -> Optional[str]:
         """Transcribe audio to text using speech recognition"""
@@ -683,7 +1720,7 @@ class SpeechToCodeOrchestrator:
             recognizer = sr.Recognizer()
             with sr.AudioFile(audio_file_path) as source:
                 audio_data = recognizer.record(source)
-                text = recognizer.recognize_google(audio_data)
+                text = recognize_google(recognizer, audio_data)
                 logger.info(f"Transcribed text: {text}")
                 return text
         except Exception as e:
@@ -691,47 +1728,172 @@ class SpeechToCodeOrchestrator:
             return None
 
 
+class AgentRegistry:
+    """App-scoped home of the long-lived agents, shared by every request
+    
+    The orchestrator (and with it each agent) is built once, on first use or
+    at startup via warm(), so requests no longer pay for agent construction
+    such as the executor's `pip list`.
+    """
+    
+    def __init__(self):
+        self._orchestrator: Optional[SpeechToCodeOrchestrator] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def orchestrator(self) -> SpeechToCodeOrchestrator:
+        if self._orchestrator is None:
+            with self._lock:
+                if self._orchestrator is None:
+                    self._orchestrator = SpeechToCodeOrchestrator()
+        return self._orchestrator
+    
+    @property
+    def executor(self) -> CodeExecutorAgent:
+        return self.orchestrator.executor
+    
+    @property
+    def explainer(self) -> CodeExplainerAgent:
+        return self.orchestrator.explainer
+    
+    def warm(self):
+        """Build every agent now rather than during the first request"""
+        return self.orchestrator
+
+
+agents = AgentRegistry()
+
+# Identical requests that arrive while one is already running share its result
+pipeline_flights = SingleFlight("pipeline")
+
+
 # Flask routes for web interface
 @app.route('/')
 def index():
     return render_template('index.html')
 
+# Live progress of running jobs, streamed by GET /api/jobs/<id>/events
+progress_hub = ProgressHub()
+
+def run_process_text(job_id: str, payload: Dict) -> Dict:
+    """Job handler: run the pipeline for a text request"""
+    text = payload['text']
+    regenerate = payload.get('regenerate', False)
+    # Regenerate requests must not join a plain run that may be served from the cache
+    flight_key = make_cache_key("process-text", normalize_transcript(text), regenerate)
+    progress = progress_hub.open(job_id)
+    try:
+        # A job that joins an identical in-flight request only reports its result
+        result, _ = pipeline_flights.do(
+            flight_key,
+            lambda: agents.orchestrator.process_request(text, force_regenerate=regenerate, progress=progress)
+        )
+    finally:
+        progress.close()
+    return result
+
+def run_enhance_code(job_id: str, payload: Dict) -> Dict:
+    """Job handler: enhance code based on feedback"""
+    code, feedback = payload['code'], payload['feedback']
+    flight_key = make_cache_key("enhance-code", code, feedback)
+    progress = progress_hub.open(job_id)
+    try:
+        result, _ = pipeline_flights.do(
+            flight_key,
+            lambda: agents.orchestrator.enhance_code(code, feedback, progress=progress)
+        )
+    finally:
+        progress.close()
+    return result
+
+# Pipelines run on background workers; the API hands out job IDs to poll
+jobs = JobQueue()
+jobs.register("process-text", run_process_text)
+jobs.register("enhance-code", run_enhance_code)
+# Lets clients tell an OpenAI outage from a bug in the pipeline
+jobs.register_error(CodeGenerationError, "upstream")
+jobs.register_error(CircuitOpenError, "upstream")
+
+def submit_job(kind: str, payload: Dict):
+    """Queue a job and answer 202 with its ID, or 429 when the queue is full"""
+    try:
+        job = jobs.submit(kind, payload)
+    except QueueFull as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(JOB_RETRY_AFTER)
+        return response, 429
+    job['status_url'] = f"/api/jobs/{job['job_id']}"
+    return jsonify(job), 202, {'Location': job['status_url']}
+
 @app.route('/api/process-text', methods=['POST'])
 def process_text_api():
-    """Process a text request and generate code"""
+    """Queue a text request for code generation; returns a job ID to poll"""
     data = request.json
     if not data or 'text' not in data:
         return jsonify({'error': 'No text provided'}), 400
     
-    text = data['text']
-    
-    try:
-        orchestrator = SpeechToCodeOrchestrator()
-        result = orchestrator.process_request(text)
-        
-        return jsonify(result)
-    except Exception as e:
-        logger.exception("Error processing request")
-        return jsonify({'error': str(e)}), 500
+    return submit_job("process-text", {'text': data['text'], 'regenerate': bool(data.get('regenerate', False))})
 
 @app.route('/api/enhance-code', methods=['POST'])
 def enhance_code_api():
-    """Enhance existing code based on feedback"""
+    """Queue an enhancement of existing code based on feedback; returns a job ID to poll"""
     data = request.json
     if not data or 'code' not in data or 'feedback' not in data:
         return jsonify({'error': 'Both code and feedback must be provided'}), 400
     
-    code = data['code']
-    feedback = data['feedback']
+    return submit_job("enhance-code", {'code': data['code'], 'feedback': data['feedback']})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_api(job_id):
+    """Status of a job, with its result or error once finished
     
-    try:
-        orchestrator = SpeechToCodeOrchestrator()
-        result = orchestrator.enhance_code(code, feedback)
-        
-        return jsonify(result)
-    except Exception as e:
-        logger.exception("Error enhancing code")
-        return jsonify({'error': str(e)}), 500
+    `?wait=N` holds the request for up to N seconds (at most JOB_MAX_WAIT)
+    until the job finishes, so clients can long-poll instead of spinning.
+    """
+    wait = min(request.args.get('wait', 0, type=float), JOB_MAX_WAIT)
+    job = jobs.wait(job_id, wait) if wait > 0 else jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events_api(job_id):
+    """Server-Sent Events stream of a job's progress
+    
+    Sends `stage` events as pipeline stages start and finish, `code` events
+    with code as it is generated, `candidate` events with each program about
+    to run, `output` events with its output, and a final `done` event with
+    the finished job. Reconnecting clients resume after `Last-Event-ID`.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    after = request.headers.get('Last-Event-ID', 0, type=int)
+    
+    def stream():
+        # A finished job's events are replayed while its channel is still retained
+        channel = progress_hub.get(job_id) if job['status'] in FINISHED else progress_hub.open(job_id)
+        if channel is not None:
+            for event in channel.events(after, heartbeat=SSE_HEARTBEAT):
+                if event is None:
+                    current = jobs.get(job_id)
+                    if current is None or current['status'] in FINISHED:
+                        break
+                    # Keep-alive; writing it is also how a disconnected client is noticed
+                    yield ": keep-alive\n\n"
+                    continue
+                seq, name, data = event
+                yield format_sse(name, data, seq)
+        # The channel closes just before the job's result is stored
+        yield format_sse("done", jobs.wait(job_id, JOB_MAX_WAIT))
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs', methods=['GET'])
+def jobs_api():
+    """Report queue depth and job counts"""
+    return jsonify(jobs.stats())
 
 
 
@@ -803,18 +1965,16 @@ def transcribe_api():
             try:
                 logger.info("Attempting transcription with OpenAI Whisper API")
                 with open(temp_audio_path, "rb") as audio:
-                    transcription = client.audio.transcriptions.create(
-                        file=audio,
-                        model="whisper-1"
-                    )
+                    text = get_gateway().transcribe(audio, model="whisper-1")
                 
-                text = transcription.text
                 logger.info(f"OpenAI Whisper transcription successful: {text}")
                 
                 # Clean up
                 os.remove(temp_audio_path)
                 return jsonify({'success': True, 'text': text})
             
+            except CircuitOpenError as e:
+                logger.warning(f"Skipping OpenAI Whisper: {str(e)}")
             except Exception as e:
                 logger.error(f"OpenAI Whisper transcription failed: {str(e)}")
                 # Fall through to try other methods
@@ -843,13 +2003,15 @@ def transcribe_api():
                 
                 with sr.AudioFile(temp_audio_path) as source:
                     audio_data = recognizer.record(source)
-                    text = recognizer.recognize_google(audio_data)
+                    text = recognize_google(recognizer, audio_data)
                     logger.info(f"Speech recognition transcription successful: {text}")
                     
                     # Clean up
                     os.remove(temp_audio_path)
                     return jsonify({'success': True, 'text': text})
             
+            except CircuitOpenError as e:
+                logger.warning(f"Skipping Google speech recognition: {str(e)}")
             except Exception as sr_error:
                 logger.error(f"Speech recognition transcription failed: {str(sr_error)}")
                 # Fall through to return error
@@ -880,8 +2042,7 @@ def execute_code_api():
     code = data['code']
     
     try:
-        executor = CodeExecutorAgent()
-        success, output = executor.execute(code)
+        success, output = agents.executor.execute(code)
         
         return jsonify({
             'success': success,
@@ -901,24 +2062,70 @@ def explain_code_api():
     code = data['code']
     
     try:
-        explainer = CodeExplainerAgent()
-        explanation = explainer.explain(code)
+        explanations = agents.orchestrator.explanations
+        explanation = run_sync(explanations.aexplain(code))
         
         return jsonify({
             'success': True,
-            'explanation': explanation
+            'explanation': explanation,
+            'explanation_id': explanations.explanation_id(code)
         })
     except Exception as e:
         logger.exception("Error explaining code")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/explanations/<explanation_id>', methods=['GET'])
+def explanation_api(explanation_id):
+    """Status of an explanation, with the explanation once it is ready
+    
+    Starts computing it if nothing has yet. `?wait=N` holds the request for
+    up to N seconds (at most JOB_MAX_WAIT) until the explanation is ready.
+    """
+    wait = min(request.args.get('wait', 0, type=float), JOB_MAX_WAIT)
+    entry = run_sync(agents.orchestrator.explanations.aget(explanation_id, wait))
+    if entry is None:
+        return jsonify({'error': 'Unknown explanation'}), 404
+    return jsonify(entry)
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats_api():
+    """Report LLM/pipeline cache hit rates and in-flight request coalescing"""
+    return jsonify({
+        'llm': get_gateway().cache.stats(),
+        'pipeline': pipeline_cache.stats(),
+        'inflight': pipeline_flights.stats(),
+        'catalog': agents.orchestrator.catalog.stats() if agents.orchestrator.catalog else None
+    })
+
+@app.route('/api/llm-stats', methods=['GET'])
+def llm_stats_api():
+    """Report client-side rate limiting, latency, hedging and routing for OpenAI calls,
+    and how often the preventive debugging pass changes code"""
+    gateway = get_gateway()
+    orchestrator = agents.orchestrator
+    return jsonify({
+        'rate_limit': gateway.limiter.stats(),
+        'latency': gateway.latency.stats(),
+        'hedging': gateway.hedge_stats(),
+        'routing': get_router().stats(),
+        'preventive_debug': dict(orchestrator.debug_stats.stats(), execute_first=orchestrator.execute_first),
+        'repair_loop': orchestrator.repair_stats.stats()
+    })
+
+@app.route('/api/health', methods=['GET'])
+def health_api():
+    """Report the circuit breaker state and recent failure rate of each backend"""
+    breakers = breaker_stats()
+    healthy = all(stats['state'] != 'open' for stats in breakers.values())
+    return jsonify({'healthy': healthy, 'backends': breakers})
+
 @app.route('/download/<filename>')
 def download_file(filename):
     """Download the generated code file"""
     return send_from_directory(GENERATED_CODE_DIR, filename, as_attachment=True)
 
 # Command-line interface for testing
-def cli_interface():
+def cli_interface(force_regenerate: bool = False):
     """Simple command-line interface for testing the orchestrator"""
     print("=" * 50)
     print("Speech-to-Code Agentic System")
@@ -927,7 +2134,7 @@ def cli_interface():
     print("Type 'exit' to quit.")
     print()
     
-    orchestrator = SpeechToCodeOrchestrator()
+    orchestrator = agents.orchestrator
     
     while True:
         text = input("Request: ")
@@ -935,7 +2142,11 @@ def cli_interface():
             break
         
         print("Processing...")
-        result = orchestrator.process_request(text)
+        try:
+            result = orchestrator.process_request(text, force_regenerate=force_regenerate)
+        except CodeGenerationError as e:
+            print(f"\n{e}\n")
+            continue
         
         print("\n" + "=" * 50)
         print("GENERATED CODE:")
@@ -950,7 +2161,9 @@ def cli_interface():
         print("\n" + "=" * 50)
         print("EXPLANATION:")
         print("=" * 50)
-        print(result["explanation"])
+        # The CLI shows everything at once, so it waits for the explanation
+        entry = orchestrator.explanations.get(result["explanation_id"], wait=PIPELINE_DEADLINE)
+        print(entry["explanation"] or entry.get("error", "Error generating explanation"))
         
         print("\n" + "=" * 50)
         print(f"Code saved to: {GENERATED_CODE_DIR / result['filename']}")
@@ -978,18 +2191,81 @@ def cli_interface():
         
         print("\n")
 
+def bulk_interface(input_path: str, output_path: str, poll_interval: float = LLM_BATCH_POLL_INTERVAL,
+                   workers: int = BULK_EXECUTION_WORKERS):
+    """Run every prompt of a JSONL file through the pipeline in bulk and write JSONL results
+    
+    Each input line is either a JSON object with a "prompt" (and optional "id")
+    or a bare JSON string.
+    """
+    entries = []
+    with open(input_path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, str):
+                entry = {"prompt": entry}
+            if not entry.get("prompt"):
+                raise ValueError(f"{input_path}:{line_number}: missing \"prompt\"")
+            entries.append(entry)
+    
+    print(f"Processing {len(entries)} prompts in bulk...")
+    orchestrator = agents.orchestrator
+    results = orchestrator.process_batch([entry["prompt"] for entry in entries], poll_interval, workers)
+    
+    with open(output_path, 'w') as f:
+        for entry, result in zip(entries, results):
+            if "id" in entry:
+                result = dict(result, id=entry["id"])
+            f.write(json.dumps(result) + "\n")
+    
+    succeeded = sum(1 for result in results if result["success"])
+    print(f"{succeeded}/{len(results)} programs ran successfully. Results written to {output_path}")
+
+def refresh_catalog_interface():
+    """Re-verify every catalog program and rewrite the manifest
+    
+    Changed programs get a new version and hash, and a fresh explanation from
+    the explainer; programs that fail are marked unverified and not served.
+    """
+    orchestrator = agents.orchestrator
+    catalog = orchestrator.catalog or Catalog()
+    outcomes = run_sync(catalog.arefresh(explain=orchestrator._aexplain_routed, save=True))
+    for entry_id, outcome in outcomes.items():
+        print(f"{entry_id}: {outcome}")
+    print(f"Catalog v{catalog.version} written to {catalog.manifest_path}")
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Speech-to-Code Agentic System")
     parser.add_argument('--web', action='store_true', help='Start web interface')
     parser.add_argument('--cli', action='store_true', help='Start CLI interface')
+    parser.add_argument('--regenerate', action='store_true', help='Ignore cached results and always run the full pipeline')
+    parser.add_argument('--bulk', metavar='PROMPTS_JSONL', help='Process a JSONL file of prompts through the Batch API')
+    parser.add_argument('--output', metavar='RESULTS_JSONL', default='bulk_results.jsonl', help='Where --bulk writes its results')
+    parser.add_argument('--poll-interval', type=float, default=LLM_BATCH_POLL_INTERVAL, help='Seconds between batch status checks')
+    parser.add_argument('--workers', type=int, default=BULK_EXECUTION_WORKERS, help='Programs executed locally at once in --bulk mode')
+    parser.add_argument('--refresh-catalog', action='store_true', help='Re-verify the program catalog and update its manifest')
     args = parser.parse_args()
     
-    if args.web:
+    if args.refresh_catalog:
+        refresh_catalog_interface()
+    elif args.bulk:
+        bulk_interface(args.bulk, args.output, args.poll_interval, args.workers)
+    elif args.web:
+        # Build the shared agents and open LLM connections now, not during the first request
+        agents.warm()
+        get_gateway().warmup()
+        # Resume jobs left unfinished by the last run, in the reloader's serving process only
+        if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            jobs.start()
+            if agents.orchestrator.catalog is not None:
+                agents.orchestrator.catalog.start_refresh(run=run_sync)
         print("Starting web interface on https://localhost:5000")
         app.run(debug=True, host='0.0.0.0', port=3010, ssl_context=("./cert.pem", "./key.pem")) # Changed to 0.0.0.0
     elif args.cli:
-        cli_interface()
+        cli_interface(force_regenerate=args.regenerate)
     else:
         # Default to CLI if no args provided
-        cli_interface()
\ No newline at end of file
+        cli_interface(force_regenerate=args.regenerate)
\ No newline at end of file
@@ -0,0 +1,420 @@
+"""Local OpenAI-compatible stand-in server for offline runs, load tests and benchmarks
+
+Point the app at it through the base URL:
+
+    python stand_in_server.py --port 8787 --latency lognormal:0.0,0.5 --rate-limit-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8787/v1 python speech-to-code.py --cli
+
+It implements the routes the agents use (chat completions, streamed or not,
+audio transcriptions, model listing and the Batch API), answers with canned
+responses shaped for each agent or with recorded ones, and injects latency,
+token-rate pacing, 429s, timeouts and server errors.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from typing import Dict, List, Optional
+
+from flask import Flask, Response, jsonify, request
+
+from response_cache import make_cache_key
+from code_patch import DIVIDER_MARKER, REPLACE_MARKER, SEARCH_MARKER
+from token_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+CODE_BLOCK_PATTERN = re.compile(r"```(?:python)?\n(.*?)```", re.DOTALL)
+DESCRIPTION_PATTERN = re.compile(r"Generate Python code for: (.*)")
+
+# Roughly four characters per streamed token
+CHARS_PER_TOKEN = 4
+
+
+class LatencyDistribution:
+    """Random delay in seconds from a spec such as "fixed:0.5", "uniform:0.2,1.5",
+    "normal:1.0,0.3" or "lognormal:0.0,0.5" (mu and sigma of the underlying normal)"""
+
+    KINDS = ("fixed", "uniform", "normal", "lognormal")
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, _, params = spec.partition(":")
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution {kind!r}; expected one of {', '.join(self.KINDS)}")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",") if value.strip()] or [0.0]
+
+    def sample(self) -> float:
+        if self.kind == "uniform":
+            return random.uniform(self.params[0], self.params[1])
+        if self.kind == "normal":
+            return max(0.0, random.gauss(self.params[0], self.params[1]))
+        if self.kind == "lognormal":
+            return random.lognormvariate(self.params[0], self.params[1])
+        return self.params[0]
+
+
+class StandInConfig:
+    """Behaviour of the stand-in server (main() maps flags and STAND_IN_* variables onto it)"""
+
+    def __init__(self, latency: str = "fixed:0.05", first_token_latency: str = "fixed:0.2",
+                 tokens_per_second: float = 200.0, rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0, timeout_rate: float = 0.0, timeout_seconds: float = 600.0,
+                 error_rate: float = 0.0, transcript: str = "Build me a Snake game",
+                 recordings: Optional[str] = None, upstream: Optional[str] = None,
+                 batch_seconds: float = 2.0):
+        self.latency = LatencyDistribution(latency)
+        self.first_token_latency = LatencyDistribution(first_token_latency)
+        self.tokens_per_second = tokens_per_second
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.error_rate = error_rate
+        self.transcript = transcript
+        self.recordings = recordings
+        self.upstream = upstream
+        self.batch_seconds = batch_seconds
+
+
+class Recordings:
+    """Recorded completions keyed by their messages, stored as JSONL"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._responses: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._responses[entry["key"]] = entry["content"]
+            logger.info(f"Loaded {len(self._responses)} recorded responses from {path}")
+
+    @staticmethod
+    def key(messages: List[Dict]) -> str:
+        # The model is left out so routed and pinned models replay the same recording
+        return make_cache_key("chat", messages)
+
+    def get(self, messages: List[Dict]) -> Optional[str]:
+        return self._responses.get(self.key(messages))
+
+    def add(self, messages: List[Dict], content: str):
+        key = self.key(messages)
+        with self._lock:
+            self._responses[key] = content
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps({"key": key, "content": content}) + "\n")
+
+
+def _first_code_block(text: str) -> str:
+    match = CODE_BLOCK_PATTERN.search(text)
+    return match.group(1) if match else ""
+
+
+def _no_op_edit(code: str) -> str:
+    """A SEARCH/REPLACE block that leaves the code unchanged, anchored on its longest line"""
+    lines = [line for line in code.splitlines() if line.strip()]
+    if not lines:
+        return ""
+    anchor = max(lines, key=len)
+    return f"{SEARCH_MARKER}\n{anchor}\n{DIVIDER_MARKER}\n{anchor}\n{REPLACE_MARKER}"
+
+
+def canned_response(messages: List[Dict]) -> str:
+    """A plausible answer for whichever agent sent the messages"""
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+
+    if "programming agent" in system:
+        match = DESCRIPTION_PATTERN.search(user)
+        description = match.group(1).strip() if match else "the request"
+        code = (
+            "def main():\n"
+            f"    request = {description!r}\n"
+            "    print(f\"Stand-in program for: {request}\")\n"
+            "\n"
+            "\n"
+            "if __name__ == \"__main__\":\n"
+            "    main()\n"
+        )
+        return f"```python\n{code}```"
+    if "debugging agent" in system or "enhancement agent" in system:
+        code = _first_code_block(user)
+        if SEARCH_MARKER in user:
+            return _no_op_edit(code)
+        return f"```python\n{code}```"
+    if "education agent" in system:
+        return ("This program defines a `main` function that prints a short message, "
+                "and calls it when the file is run directly.")
+    return "OK"
+
+
+def _error(status: int, message: str, error_type: str, code: Optional[str] = None,
+           headers: Optional[Dict[str, str]] = None) -> Response:
+    response = jsonify({"error": {"message": message, "type": error_type, "param": None, "code": code}})
+    response.status_code = status
+    for name, value in (headers or {}).items():
+        response.headers[name] = value
+    return response
+
+
+def create_app(config: Optional[StandInConfig] = None) -> Flask:
+    """Build the stand-in Flask app"""
+    config = config or StandInConfig()
+    recordings = Recordings(config.recordings)
+    app = Flask(__name__)
+    stats = {"requests": 0, "rate_limited": 0, "timed_out": 0, "errors": 0, "recorded": 0, "replayed": 0}
+    stats_lock = threading.Lock()
+    files: Dict[str, bytes] = {}
+    batches: Dict[str, Dict] = {}
+    batch_lock = threading.Lock()
+
+    def count(name: str):
+        with stats_lock:
+            stats[name] += 1
+
+    def inject_failure() -> Optional[Response]:
+        """Return an injected failure response, or None to serve the request normally"""
+        count("requests")
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            count("rate_limited")
+            return _error(429, "Rate limit reached (injected by stand-in server)", "requests",
+                          "rate_limit_exceeded", {"retry-after": str(config.retry_after)})
+        roll -= config.rate_limit_rate
+        if roll < config.timeout_rate:
+            count("timed_out")
+            time.sleep(config.timeout_seconds)
+            return _error(504, "Upstream timed out (injected by stand-in server)", "server_error")
+        roll -= config.timeout_rate
+        if roll < config.error_rate:
+            count("errors")
+            return _error(500, "Internal error (injected by stand-in server)", "server_error")
+        return None
+
+    def complete(body: Dict) -> str:
+        """Content for a chat request: recorded, fetched from upstream and recorded, or canned"""
+        messages = body["messages"]
+        content = recordings.get(messages)
+        if content is not None:
+            count("replayed")
+            return content
+        if config.upstream:
+            import httpx
+            upstream_body = dict(body, stream=False)
+            response = httpx.post(
+                f"{config.upstream.rstrip('/')}/chat/completions",
+                json=upstream_body,
+                headers={"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', '')}"},
+                timeout=300
+            )
+            response.raise_for_status()
+            content = response.json()["choices"][0]["message"]["content"]
+            recordings.add(messages, content)
+            count("recorded")
+            return content
+        return canned_response(messages)
+
+    def usage(body: Dict, content: str) -> Dict:
+        model = body.get("model", "")
+        prompt_tokens = sum(count_tokens(m.get("content") or "", model) for m in body["messages"])
+        completion_tokens = count_tokens(content, model)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    @app.route("/v1/models", methods=["GET"])
+    def list_models():
+        return jsonify({"object": "list", "data": [
+            {"id": model, "object": "model", "created": 0, "owned_by": "stand-in"}
+            for model in ("gpt-4.1-nano", "gpt-4.1-mini", "gpt-4.1", "whisper-1")
+        ]})
+
+    @app.route("/v1/chat/completions", methods=["POST"])
+    def chat_completions():
+        failure = inject_failure()
+        if failure is not None:
+            return failure
+        body = request.get_json()
+        content = complete(body)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "stand-in")
+        created = int(time.time())
+
+        if body.get("stream"):
+            def events():
+                time.sleep(config.first_token_latency.sample())
+                for start in range(0, len(content), CHARS_PER_TOKEN):
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [{"index": 0, "delta": {"content": content[start:start + CHARS_PER_TOKEN]},
+                                     "finish_reason": None}]
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    if config.tokens_per_second > 0:
+                        time.sleep(1.0 / config.tokens_per_second)
+                final = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                }
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+            return Response(events(), mimetype="text/event-stream")
+
+        token_usage = usage(body, content)
+        delay = config.latency.sample()
+        if config.tokens_per_second > 0:
+            delay += token_usage["completion_tokens"] / config.tokens_per_second
+        time.sleep(delay)
+        return jsonify({
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": token_usage
+        })
+
+    @app.route("/v1/audio/transcriptions", methods=["POST"])
+    def audio_transcriptions():
+        failure = inject_failure()
+        if failure is not None:
+            return failure
+        time.sleep(config.latency.sample())
+        if request.form.get("response_format") == "text":
+            return Response(config.transcript, mimetype="text/plain")
+        return jsonify({"text": config.transcript})
+
+    @app.route("/v1/files", methods=["POST"])
+    def upload_file():
+        upload = request.files["file"]
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        files[file_id] = upload.read()
+        return jsonify({"id": file_id, "object": "file", "bytes": len(files[file_id]), "created_at": int(time.time()),
+                        "filename": upload.filename, "purpose": request.form.get("purpose", "batch"),
+                        "status": "processed"})
+
+    @app.route("/v1/files/<file_id>/content", methods=["GET"])
+    def file_content(file_id):
+        if file_id not in files:
+            return _error(404, f"No such file: {file_id}", "invalid_request_error")
+        return Response(files[file_id], mimetype="application/jsonl")
+
+    def batch_view(batch: Dict) -> Dict:
+        """Public view of a batch; it completes once batch_seconds have passed"""
+        with batch_lock:
+            if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= config.batch_seconds:
+                finish_batch(batch)
+            return dict(batch)
+
+    def finish_batch(batch: Dict):
+        """Answer every request in a batch and attach the output file"""
+        lines = []
+        for line in files[batch["input_file_id"]].decode("utf-8").splitlines():
+            item = json.loads(line)
+            content = complete(item["body"])
+            lines.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                "custom_id": item["custom_id"],
+                "response": {"status_code": 200, "body": {
+                    "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion",
+                    "model": item["body"].get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                    "usage": usage(item["body"], content)
+                }},
+                "error": None
+            }))
+        output_id = f"file-{uuid.uuid4().hex[:12]}"
+        files[output_id] = "\n".join(lines).encode("utf-8")
+        batch.update(status="completed", output_file_id=output_id, completed_at=int(time.time()))
+        batch["request_counts"]["completed"] = len(lines)
+
+    @app.route("/v1/batches", methods=["POST"])
+    def create_batch():
+        body = request.get_json()
+        if body["input_file_id"] not in files:
+            return _error(404, f"No such file: {body['input_file_id']}", "invalid_request_error")
+        total = len(files[body["input_file_id"]].splitlines())
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        batches[batch_id] = {
+            "id": batch_id, "object": "batch", "endpoint": body["endpoint"], "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window", "24h"), "status": "in_progress",
+            "created_at": int(time.time()), "output_file_id": None, "error_file_id": None,
+            "request_counts": {"total": total, "completed": 0, "failed": 0}
+        }
+        return jsonify(batch_view(batches[batch_id]))
+
+    @app.route("/v1/batches/<batch_id>", methods=["GET"])
+    def retrieve_batch(batch_id):
+        if batch_id not in batches:
+            return _error(404, f"No such batch: {batch_id}", "invalid_request_error")
+        return jsonify(batch_view(batches[batch_id]))
+
+    @app.route("/v1/batches/<batch_id>/cancel", methods=["POST"])
+    def cancel_batch(batch_id):
+        if batch_id not in batches:
+            return _error(404, f"No such batch: {batch_id}", "invalid_request_error")
+        batches[batch_id]["status"] = "cancelled"
+        return jsonify(batch_view(batches[batch_id]))
+
+    @app.route("/stats", methods=["GET"])
+    def server_stats():
+        with stats_lock:
+            return jsonify(dict(stats))
+
+    return app
+
+
+def main():
+    def env(name: str, default: str) -> str:
+        return os.getenv(f"STAND_IN_{name}", default)
+
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server")
+    parser.add_argument("--host", default=env("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(env("PORT", "8787")))
+    parser.add_argument("--latency", default=env("LATENCY", "fixed:0.05"),
+                        help="Delay before a non-streamed response, e.g. lognormal:0.0,0.5")
+    parser.add_argument("--first-token-latency", default=env("FIRST_TOKEN_LATENCY", "fixed:0.2"),
+                        help="Delay before the first streamed token")
+    parser.add_argument("--tokens-per-second", type=float, default=float(env("TOKENS_PER_SECOND", "200")),
+                        help="Output token rate (0 for no pacing)")
+    parser.add_argument("--rate-limit-rate", type=float, default=float(env("RATE_LIMIT_RATE", "0")),
+                        help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=float(env("RETRY_AFTER", "1")),
+                        help="Retry-After seconds sent with 429s")
+    parser.add_argument("--timeout-rate", type=float, default=float(env("TIMEOUT_RATE", "0")),
+                        help="Fraction of requests that hang")
+    parser.add_argument("--timeout-seconds", type=float, default=float(env("TIMEOUT_SECONDS", "600")),
+                        help="How long hanging requests hang")
+    parser.add_argument("--error-rate", type=float, default=float(env("ERROR_RATE", "0")),
+                        help="Fraction of requests answered with 500")
+    parser.add_argument("--transcript", default=env("TRANSCRIPT", "Build me a Snake game"),
+                        help="Text returned by audio transcriptions")
+    parser.add_argument("--recordings", default=env("RECORDINGS", "") or None,
+                        help="JSONL file of recorded responses to replay")
+    parser.add_argument("--upstream", default=env("UPSTREAM", "") or None,
+                        help="Real API base URL; responses missing from --recordings are fetched and recorded")
+    parser.add_argument("--batch-seconds", type=float, default=float(env("BATCH_SECONDS", "2")),
+                        help="Time a batch takes to complete")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    config = StandInConfig(
+        latency=args.latency, first_token_latency=args.first_token_latency,
+        tokens_per_second=args.tokens_per_second, rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after, timeout_rate=args.timeout_rate, timeout_seconds=args.timeout_seconds,
+        error_rate=args.error_rate, transcript=args.transcript, recordings=args.recordings,
+        upstream=args.upstream, batch_seconds=args.batch_seconds
+    )
+    print(f"Stand-in OpenAI server on http://{args.host}:{args.port}/v1")
+    create_app(config).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
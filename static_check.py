@@ -0,0 +1,209 @@
+import re
+import ast
+import sys
+import keyword
+import builtins
+import difflib
+import logging
+import textwrap
+import importlib.util
+from typing import Iterable, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# First line of a report; code_context treats it like a traceback header
+REPORT_HEADER = "Static check failed (the code was not executed):"
+# Filename used in reports, so the debugger can localize them like a traceback
+REPORT_FILENAME = "<generated>"
+
+SYNTAX = "syntax"
+PROSE = "prose"
+UNDEFINED_NAME = "undefined-name"
+MISSING_IMPORT = "missing-import"
+
+FENCE_PATTERN = re.compile(r"```[^\n]*\n(.*?)(?:```|\Z)", re.DOTALL)
+# Characters that rarely appear in a sentence but almost always in a line of code
+CODE_CHARACTERS = set("=[]{}_\\")
+# Prose lines stripped from either end of a file by repair()
+MAX_PROSE_LINES = 5
+
+# Names that exist at module level without being bound in the code
+MODULE_NAMES = set(dir(builtins)) | {"__file__", "__builtins__", "__annotations__", "__path__", "__class__"}
+# Calls that can bind names the AST can't see
+DYNAMIC_SCOPE_CALLS = {"exec", "globals", "locals", "vars"}
+STDLIB_MODULES = getattr(sys, "stdlib_module_names", frozenset())
+# Match-statement patterns that bind names (Python 3.10+)
+MATCH_CAPTURES = tuple(getattr(ast, name) for name in ("MatchAs", "MatchStar", "MatchMapping") if hasattr(ast, name))
+
+
+class Diagnostic(NamedTuple):
+    """One problem found without running the code"""
+    kind: str
+    line: int
+    message: str
+    error: str  # the exception the code would raise, e.g. "NameError"
+
+
+def looks_like_prose(line: str) -> bool:
+    """True for a line of English (or Markdown) rather than Python"""
+    text = line.strip()
+    text = re.sub(r"^(?:[-*>]|\d+[.)]|#{1,6})\s+", "", text)
+    words = text.split()
+    if len(words) < 4 or keyword.iskeyword(words[0]):
+        return False
+    return not CODE_CHARACTERS & set(text) and all(re.match(r"^[\w'’\"(,.:;!?)-]+$", word) for word in words)
+
+
+def _syntax_error(code: str) -> Optional[SyntaxError]:
+    try:
+        compile(code, REPORT_FILENAME, "exec")
+    except SyntaxError as e:
+        return e
+    except ValueError as e:
+        # e.g. null bytes in the source
+        return SyntaxError(str(e))
+    return None
+
+
+def repair(code: str) -> str:
+    """Cheap, local fixes for output that doesn't parse; returns the code unchanged if none works
+
+    Tries, in order: the first fenced block of a Markdown answer, the code
+    left after stripping prose lines from either end, a dedent, and
+    expanding tabs.
+    """
+    if not code.strip() or _syntax_error(code) is None:
+        return code
+    candidates = []
+    match = FENCE_PATTERN.search(code)
+    if match:
+        candidates.append(match.group(1))
+    lines = code.splitlines()
+    start, end = 0, len(lines)
+    while start < min(end, MAX_PROSE_LINES) and (not lines[start].strip() or looks_like_prose(lines[start])):
+        start += 1
+    while end > max(start, len(lines) - MAX_PROSE_LINES) and (not lines[end - 1].strip() or looks_like_prose(lines[end - 1])):
+        end -= 1
+    if (start, end) != (0, len(lines)):
+        candidates.append("\n".join(lines[start:end]))
+    candidates.append(textwrap.dedent(code))
+    candidates.append(code.expandtabs(4))
+
+    for candidate in candidates:
+        candidate = candidate.strip("\n")
+        if candidate.strip() and _syntax_error(candidate) is None:
+            logger.info("Repaired model output locally instead of sending it back to a model")
+            return candidate
+    return code
+
+
+def _bound_names(tree: ast.AST) -> Optional[Set[str]]:
+    """Every name bound anywhere in the module, or None if bindings can't be known statically"""
+    bound: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            bound.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name == "*":
+                    return None
+                bound.add(alias.asname or alias.name.split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            bound.update(node.names)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in DYNAMIC_SCOPE_CALLS:
+            return None
+        elif isinstance(node, MATCH_CAPTURES):
+            capture = getattr(node, "name", None) or getattr(node, "rest", None)
+            if capture:
+                bound.add(capture)
+    return bound
+
+
+def _undefined_names(tree: ast.AST) -> List[Diagnostic]:
+    """Names that are read but never bound anywhere in the file
+
+    Scopes are not modelled: a name bound anywhere counts as bound everywhere.
+    That misses some errors but never reports a name that does exist.
+    """
+    bound = _bound_names(tree)
+    if bound is None:
+        return []
+    diagnostics = []
+    seen: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            if node.id in bound or node.id in MODULE_NAMES or node.id in seen:
+                continue
+            seen.add(node.id)
+            message = f"name '{node.id}' is not defined"
+            close = difflib.get_close_matches(node.id, bound, n=1)
+            if close:
+                message += f". Did you mean: '{close[0]}'?"
+            diagnostics.append(Diagnostic(UNDEFINED_NAME, node.lineno, message, "NameError"))
+    return sorted(diagnostics, key=lambda diagnostic: diagnostic.line)
+
+
+def _missing_imports(tree: ast.Module, installable: Iterable[str]) -> List[Diagnostic]:
+    """Unconditional top-level imports of modules that aren't installed and won't be
+
+    Imports inside try/if blocks or functions are skipped: generated code
+    often guards optional dependencies itself.
+    """
+    installable = set(installable)
+    diagnostics = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+            modules = [node.module]
+        else:
+            continue
+        for module in modules:
+            top = module.split(".")[0]
+            if top in STDLIB_MODULES or top in installable:
+                continue
+            try:
+                found = importlib.util.find_spec(top) is not None
+            except (ImportError, ValueError):
+                found = False
+            if not found:
+                diagnostics.append(Diagnostic(MISSING_IMPORT, node.lineno, f"No module named '{top}'",
+                                              "ModuleNotFoundError"))
+    return diagnostics
+
+
+def validate(code: str, installable: Iterable[str] = ()) -> List[Diagnostic]:
+    """Check code without running it: syntax, prose, undefined names and imports
+
+    `installable` lists import names the executor installs on demand, so
+    they aren't reported as missing. An empty list means the code passed.
+    """
+    if not code.strip():
+        return [Diagnostic(SYNTAX, 1, "the output contains no code", "SyntaxError")]
+    error = _syntax_error(code)
+    if error is not None:
+        line = error.lineno or 1
+        lines = code.splitlines()
+        if 0 < line <= len(lines) and looks_like_prose(lines[line - 1]):
+            return [Diagnostic(PROSE, line, "this line is prose, not Python; return only code", "SyntaxError")]
+        return [Diagnostic(SYNTAX, line, error.msg or str(error), type(error).__name__)]
+    tree = ast.parse(code)
+    return _undefined_names(tree) + _missing_imports(tree, installable)
+
+
+def format_report(code: str, diagnostics: List[Diagnostic]) -> str:
+    """Traceback-style report of diagnostics, for the debugger and the user"""
+    lines = code.splitlines()
+    report = [REPORT_HEADER]
+    for diagnostic in diagnostics:
+        report.append(f'  File "{REPORT_FILENAME}", line {diagnostic.line}')
+        if 0 < diagnostic.line <= len(lines):
+            report.append(f"    {lines[diagnostic.line - 1].strip()}")
+        report.append(f"{diagnostic.error}: {diagnostic.message}")
+    return "\n".join(report)
@@ -0,0 +1,137 @@
+import math
+import logging
+from functools import lru_cache
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Try to import tiktoken for exact token counts
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+    logger.info("tiktoken not available, using approximate token counts")
+
+# Context window and output limits of the models the agents use
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4.1": 1047576,
+    "gpt-4.1-mini": 1047576,
+    "gpt-4.1-nano": 1047576,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-turbo-preview": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+}
+MODEL_MAX_OUTPUT_TOKENS = {
+    "gpt-4.1": 32768,
+    "gpt-4.1-mini": 32768,
+    "gpt-4.1-nano": 32768,
+    "gpt-4o": 16384,
+    "gpt-4o-mini": 16384,
+    "gpt-4-turbo": 4096,
+    "gpt-4-turbo-preview": 4096,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 4096,
+}
+DEFAULT_CONTEXT_WINDOW = 128000
+DEFAULT_MAX_OUTPUT_TOKENS = 4096
+
+# Tokens added by the chat format around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+# Smallest completion worth sending a request for
+MIN_OUTPUT_TOKENS = 256
+
+
+class PromptTooLargeError(ValueError):
+    """Raised before the network call when a prompt leaves no room for the completion"""
+
+
+@lru_cache(maxsize=None)
+def _encoding_for(model: str):
+    """Return the tiktoken encoding for a model, or None when unavailable"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Newer model names are not always registered; pick the family's encoding
+        name = "o200k_base" if model.startswith(("gpt-4o", "gpt-4.1", "o1", "o3", "o4")) else "cl100k_base"
+        try:
+            return tiktoken.get_encoding(name)
+        except Exception as e:
+            logger.warning(f"Could not load tiktoken encoding {name}: {str(e)}")
+            return None
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding for {model}: {str(e)}")
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Count the tokens in text for a model (approximate without tiktoken)"""
+    if not text:
+        return 0
+    encoding = _encoding_for(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Roughly four characters per token for English prose and Python source
+    return math.ceil(len(text) / 4)
+
+
+def count_prompt_tokens(model: str, *messages: str) -> int:
+    """Count the tokens of a chat prompt made of the given message contents"""
+    return sum(count_tokens(content, model) + MESSAGE_OVERHEAD_TOKENS for content in messages) + 3
+
+
+def _lookup(table: dict, model: str, default: int) -> int:
+    if model in table:
+        return table[model]
+    # Dated snapshots such as gpt-4o-2024-08-06 share their base model's limits
+    for name in sorted(table, key=len, reverse=True):
+        if model.startswith(name):
+            return table[name]
+    return default
+
+
+def context_window(model: str) -> int:
+    return _lookup(MODEL_CONTEXT_WINDOWS, model, DEFAULT_CONTEXT_WINDOW)
+
+
+def max_output_tokens(model: str) -> int:
+    return _lookup(MODEL_MAX_OUTPUT_TOKENS, model, DEFAULT_MAX_OUTPUT_TOKENS)
+
+
+def fit_max_tokens(model: str, prompt_tokens: int, requested: int) -> int:
+    """Clamp a requested completion size to what the model and prompt leave room for"""
+    available = context_window(model) - prompt_tokens
+    if available < MIN_OUTPUT_TOKENS:
+        raise PromptTooLargeError(
+            f"Prompt of {prompt_tokens} tokens leaves no room for a completion "
+            f"in {model}'s {context_window(model)}-token context"
+        )
+    return max(1, min(requested, max_output_tokens(model), available))
+
+
+def rewrite_budget(input_tokens: int, ratio: float = 1.3, overhead: int = 256,
+                   floor: int = 1024) -> int:
+    """Completion size for a response that restates (and slightly grows) its input"""
+    return max(floor, int(input_tokens * ratio) + overhead)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str, keep: str = "head",
+                       marker: Optional[str] = None) -> str:
+    """Trim text to at most max_tokens, keeping its head or its tail"""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    marker = marker if marker is not None else "\n...[truncated]...\n"
+    encoding = _encoding_for(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        kept = tokens[:max_tokens] if keep == "head" else tokens[-max_tokens:]
+        trimmed = encoding.decode(kept)
+    else:
+        chars = max_tokens * 4
+        trimmed = text[:chars] if keep == "head" else text[-chars:]
+    return trimmed + marker if keep == "head" else marker + trimmed